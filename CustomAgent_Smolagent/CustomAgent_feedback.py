@@ -1,18 +1,8 @@
 from db.db import init_schema
 from db.db import connect   
-from smolagents.agents import CodeAgent
-from smolagents.models import AmazonBedrockServerModel
-from tools.generate_submission_name import GenerateSubmissionNameTool
-from tools.prepare_metadata import PrepareAllMetadataTool
-from tools.get_my_studies import GetMyStudiesTool
-from tools.create_submission import CreateSubmissionTool
-from tools.create_batch import CreateBatchTool
-#from tools.log_feedback import LogFeedbackTool
 #from feedback_input import ask_user_feedback
 import os
 
-init_schema()
-
 API_URL = "https://hub-qa.datacommons.cancer.gov/api/graphql"
 SUBMIT_TOKEN = os.getenv("SUBMITTER_TOKEN")
 
@@ -21,26 +11,42 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
-model = AmazonBedrockServerModel(
-    model_id="anthropic.claude-3-haiku-20240307-v1:0",
-    client_kwargs={"region_name":"us-east-1"},
-    inferenceConfig={"maxTokens":2048}
-)
 
-agent = CodeAgent(
-    model=model,
-    tools=[CreateBatchTool(),
-           CreateSubmissionTool(),
-           GenerateSubmissionNameTool(),
-           GetMyStudiesTool(),
-           PrepareAllMetadataTool(),
-           
-        #   UpdateBatchTool(),
-        #   UploadFileTool(),
-    ],
-    max_steps=3,
-    additional_authorized_imports=['os', 'shutil', 'json', 'requests', 'time', 'datetime', 'pathlib']
-)
+def build_agent():
+    # smolagents and the tool modules are imported on first use, not with this module
+    from smolagents.agents import CodeAgent
+    from smolagents.models import AmazonBedrockServerModel
+    from llm.cache import cache_model
+    from tools import create_tools
+
+    init_schema()
+
+    model = AmazonBedrockServerModel(
+        model_id="anthropic.claude-3-haiku-20240307-v1:0",
+        client_kwargs={"region_name":"us-east-1"},
+        inferenceConfig={"maxTokens":2048}
+    )
+    cache_model(model)
+
+    return CodeAgent(
+        model=model,
+        tools=create_tools(
+            "create_batch",
+            "create_submission",
+            "generate_submission_name",
+            "get_my_studies",
+            "prepare_all_sample_metadata",
+            # "update_batch",
+            # "upload_file",
+            # "log_feedback",
+        ),
+        max_steps=3,
+        additional_authorized_imports=['os', 'shutil', 'json', 'requests', 'time', 'datetime', 'pathlib']
+    )
+
+
+if __name__ == "__main__":
+    agent = build_agent()
 
 
 #print(agent.run(
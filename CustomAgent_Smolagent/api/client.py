@@ -0,0 +1,259 @@
+"""client.py
+
+Shared GraphQL client for the CRDC Datahub API.
+
+All tools go through one pooled client so repeated calls reuse keep-alive
+connections instead of paying a new TCP+TLS handshake per request.
+Configuration is read from the environment:
+
+    CRDC_API_URL        GraphQL endpoint (defaults to hub-qa)
+    SUBMITTER_TOKEN     Bearer token
+    CRDC_POOL_SIZE      max pooled connections per host (default 16)
+    CRDC_CONNECT_TIMEOUT / CRDC_READ_TIMEOUT   seconds (default 10 / 120)
+    CRDC_HTTP2          "1" to use httpx with HTTP/2 if it is installed
+    CRDC_RATE_LIMIT     max GraphQL requests per second across all threads (default unlimited)
+
+Transient failures are retried and a circuit breaker guards the endpoint; see
+`api/resilience.py` for those settings. Every attempt is recorded in the
+`api_attempts` table of feedback.db.
+"""
+from typing import Any, Callable
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # optional, only needed for HTTP/2
+    httpx = None
+
+from api.resilience import CircuitBreaker, RetryPolicy, classify
+from db.writer import queue_row
+from tracing.spans import current_span, span
+
+DEFAULT_API_URL = "https://hub-qa.datacommons.cancer.gov/api/graphql"
+API_URL = os.getenv("CRDC_API_URL", DEFAULT_API_URL)
+
+INSERT_ATTEMPT = """
+    INSERT INTO api_attempts (operation, attempt, outcome, status_code, error, elapsed_ms)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+class GraphQLError(Exception):
+    """Raised when the response carries a GraphQL `errors` entry."""
+
+    def __init__(self, errors: list):
+        super().__init__(f"GraphQL errors: {errors}")
+        self.errors = errors
+
+
+class RateLimiter:
+    """Token bucket shared by all threads; `acquire` blocks until a request may be sent."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class GraphQLClient:
+    def __init__(
+        self,
+        api_url: str | None = None,
+        token: str | None = None,
+        pool_size: int | None = None,
+        connect_timeout: float | None = None,
+        read_timeout: float | None = None,
+        http2: bool | None = None,
+        rate_limit: float | None = None,
+        retry: RetryPolicy | None = None,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.api_url = api_url or os.getenv("CRDC_API_URL", DEFAULT_API_URL)
+        self.token = token if token is not None else os.getenv("SUBMITTER_TOKEN")
+        self.pool_size = pool_size or int(os.getenv("CRDC_POOL_SIZE", "16"))
+        self.timeout = (
+            connect_timeout or float(os.getenv("CRDC_CONNECT_TIMEOUT", "10")),
+            read_timeout or float(os.getenv("CRDC_READ_TIMEOUT", "120")),
+        )
+        if http2 is None:
+            http2 = os.getenv("CRDC_HTTP2", "0") == "1"
+        self.http2 = bool(http2 and httpx is not None)
+        if rate_limit is None:
+            rate_limit = float(os.getenv("CRDC_RATE_LIMIT", "0"))
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit > 0 else None
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+
+        self.headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+        }
+
+        # requests.Session is used for uploads even when GraphQL goes over HTTP/2
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._httpx = None
+        if self.http2:
+            self._httpx = httpx.Client(
+                http2=True,
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                ),
+            )
+
+        self._stats: dict[str, dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+
+    def post(self, payload: dict) -> Any:
+        """POST a GraphQL payload and return the decoded JSON body."""
+        if self._httpx is not None:
+            res = self._httpx.post(self.api_url, json=payload, headers=self.headers)
+        else:
+            res = self.session.post(self.api_url, json=payload, headers=self.headers, timeout=self.timeout)
+        s = current_span()
+        if s is not None and s.kind == "http":
+            s.set(status_code=res.status_code)
+            s.add_bytes(len(res.content))
+        res.raise_for_status()
+        return res.json()
+
+    def execute(self, query: str, variables: dict | None = None, operation: str = "graphql",
+                retry: RetryPolicy | None = None, before_retry: Callable[[Exception], dict | None] | None = None) -> dict:
+        """
+        Run a query or mutation and return its `data` object.
+        Transient failures are retried with `retry` (default: the client's policy).
+        `before_retry(exc)` is called before each retry; if it returns a value, that is
+        returned instead of retrying (e.g. the mutation turned out to have succeeded).
+        Raises on GraphQL `errors`, on non-transient HTTP errors, when retries run out,
+        and with CircuitOpenError while the endpoint's circuit is open.
+        """
+        payload = {"query": query}
+        if variables is not None:
+            payload["variables"] = variables
+        policy = retry or self.retry
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self.breaker.before_call()
+            except Exception as e:
+                self._log_attempt(operation, attempt, "circuit_open", None, e, 0.0)
+                raise
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                with span(f"graphql {operation}", "http", attempt=attempt):
+                    data = self.post(payload)
+                    if "errors" in data:
+                        raise GraphQLError(data["errors"])
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                self._record(operation, elapsed, False)
+                transient, status, retry_after = classify(e)
+                if not transient:
+                    # the endpoint answered, so it counts as healthy for the breaker
+                    self.breaker.record_success()
+                    self._log_attempt(operation, attempt, "failed", status, e, elapsed)
+                    raise
+                self.breaker.record_failure()
+                if attempt >= policy.max_attempts:
+                    self._log_attempt(operation, attempt, "failed", status, e, elapsed)
+                    raise
+                self._log_attempt(operation, attempt, "retry", status, e, elapsed)
+                time.sleep(policy.delay(attempt, retry_after))
+                if before_retry is not None:
+                    recovered = before_retry(e)
+                    if recovered is not None:
+                        self._log_attempt(operation, attempt, "recovered", status, None, 0.0)
+                        return recovered
+                continue
+            elapsed = time.perf_counter() - start
+            self._record(operation, elapsed, True)
+            self.breaker.record_success()
+            self._log_attempt(operation, attempt, "ok", None, None, elapsed)
+            return data["data"]
+
+    def _log_attempt(self, operation: str, attempt: int, outcome: str, status: int | None,
+                     error: Exception | None, elapsed: float) -> None:
+        try:
+            queue_row(INSERT_ATTEMPT, (operation, attempt, outcome, status,
+                                       str(error)[:500] if error else None, elapsed * 1e3))
+        except Exception as e:
+            print(f"Failed to record API attempt: {e}")
+
+    def _record(self, operation: str, elapsed: float, ok: bool) -> None:
+        with self._stats_lock:
+            s = self._stats.setdefault(
+                operation, {"count": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0}
+            )
+            s["count"] += 1
+            s["errors"] += 0 if ok else 1
+            s["total_s"] += elapsed
+            s["max_s"] = max(s["max_s"], elapsed)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Per-operation latency counters: count, errors, total_s, max_s, avg_s."""
+        with self._stats_lock:
+            out = {}
+            for op, s in self._stats.items():
+                out[op] = dict(s, avg_s=s["total_s"] / s["count"] if s["count"] else 0.0)
+            return out
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._stats.clear()
+
+    def close(self) -> None:
+        self.session.close()
+        if self._httpx is not None:
+            self._httpx.close()
+
+
+_client: GraphQLClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> GraphQLClient:
+    """Return the process-wide shared client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GraphQLClient()
+    return _client
+
+
+def configure_client(**kwargs) -> GraphQLClient:
+    """Replace the shared client, e.g. to change pool size or point at another endpoint."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = GraphQLClient(**kwargs)
+    return _client
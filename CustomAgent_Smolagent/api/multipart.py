@@ -0,0 +1,163 @@
+"""multipart.py
+
+Resumable multipart uploads for very large data files.
+
+Uses the S3 multipart REST protocol (`?uploads`, `?partNumber=&uploadId=`,
+`?uploadId=`) against the object addressed by a signed URL. Every completed
+part is recorded in feedback.db (`upload_sessions` / `upload_parts`), so a
+crashed or expired upload continues from the first missing part when it is
+retried, even with a freshly issued signed URL for the same object.
+
+The multipart requests go to the object URL without the presigned query
+string, i.e. unsigned: a presigned PUT URL from Datahub only authorizes a single
+PUT. Multipart is therefore only attempted against endpoints that are listed as
+accepting unsigned multipart requests (e.g. a local MinIO or the mock server):
+
+    CRDC_MULTIPART_ENDPOINTS   comma-separated origins, e.g. "http://127.0.0.1:8765"
+
+Any other URL fails with an UploadError before anything is sent; use
+`stream_put` for those.
+"""
+from urllib.parse import urlsplit
+import os
+import time
+import xml.etree.ElementTree as ET
+
+from api.client import get_client
+from api.upload import ChunkedFileReader, UploadError, guess_content_type, object_key
+from tracing.spans import span
+from db.db import (
+    find_upload_session,
+    create_upload_session,
+    get_uploaded_parts,
+    record_upload_part,
+    complete_upload_session,
+)
+
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+MIN_PART_SIZE = 5 * 1024 * 1024   # S3 minimum for every part but the last
+MAX_PARTS = 10000
+
+
+def _xml_text(body: str, tag: str) -> str | None:
+    root = ET.fromstring(body)
+    for el in root.iter():
+        if el.tag == tag or el.tag.endswith("}" + tag):
+            return el.text
+    return None
+
+
+def _part_size_for(file_size: int, part_size: int) -> int:
+    part_size = max(part_size, MIN_PART_SIZE)
+    # S3 allows at most 10,000 parts; grow the part size for huge files
+    return max(part_size, -(-file_size // MAX_PARTS))
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def multipart_supported(url: str) -> bool:
+    """True if `url`'s origin is listed in CRDC_MULTIPART_ENDPOINTS."""
+    endpoints = os.getenv("CRDC_MULTIPART_ENDPOINTS", "")
+    allowed = {_origin(e.strip()) for e in endpoints.split(",") if e.strip()}
+    return _origin(url) in allowed
+
+
+def _check(res, what: str) -> None:
+    if not res.ok:
+        raise UploadError(f"{what} failed: {res.status_code} {res.text}", res.status_code)
+
+
+def multipart_put(url: str, file_path: str, part_size: int = DEFAULT_PART_SIZE,
+                  chunk_size: int | None = None, max_retries: int = 3,
+                  content_type: str | None = None) -> dict:
+    """
+    Upload `file_path` to the object behind `url` in parts, resuming any earlier
+    unfinished upload of the same file. Returns
+    {"bytes", "seconds", "bytes_per_sec", "parts", "resumed_parts"} where
+    `bytes` counts only what was sent in this call. Raises UploadError if the
+    endpoint is not listed in CRDC_MULTIPART_ENDPOINTS.
+    """
+    if not multipart_supported(url):
+        raise UploadError(
+            f"Resumable upload needs an endpoint that accepts unsigned multipart requests; "
+            f"{_origin(url)} is not listed in CRDC_MULTIPART_ENDPOINTS. Upload with resumable=False instead."
+        )
+    client = get_client()
+    session = client.session
+    key = object_key(url)
+    st = os.stat(file_path)
+    file_size, file_mtime = st.st_size, st.st_mtime
+
+    existing = find_upload_session(key, file_path, file_size, file_mtime)
+    if existing:
+        session_id, upload_id, part_size = existing
+        done = get_uploaded_parts(session_id)
+    else:
+        part_size = _part_size_for(file_size, part_size)
+        res = session.post(key, params={"uploads": ""},
+                           headers={"Content-Type": content_type or guess_content_type(file_path)},
+                           timeout=client.timeout)
+        _check(res, "CreateMultipartUpload")
+        upload_id = _xml_text(res.text, "UploadId")
+        if not upload_id:
+            raise UploadError(f"CreateMultipartUpload returned no UploadId: {res.text}")
+        session_id = create_upload_session(key, file_path, file_size, file_mtime, part_size, upload_id)
+        done = {}
+
+    part_count = max(1, -(-file_size // part_size))
+    resumed = len(done)
+    sent = 0
+    start = time.perf_counter()
+
+    for part_number in range(1, part_count + 1):
+        if part_number in done:
+            continue
+        offset = (part_number - 1) * part_size
+        for attempt in range(1, max(1, max_retries) + 1):
+            try:
+                with ChunkedFileReader(file_path, chunk_size=chunk_size or part_size,
+                                       offset=offset, length=part_size) as body, \
+                        span("upload part", "http", part=part_number, attempt=attempt) as s:
+                    length = len(body)
+                    res = session.put(key, params={"partNumber": part_number, "uploadId": upload_id},
+                                      data=body if length else b"",
+                                      headers={"Content-Length": str(length)}, timeout=client.timeout)
+                    if s is not None:
+                        s.set(status_code=res.status_code)
+                        s.add_bytes(length)
+                _check(res, f"UploadPart {part_number}")
+                break
+            except UploadError as e:
+                # 403/404 mean the URL expired or the upload is gone; leave the recorded parts for a retry
+                if attempt == max_retries or (e.status_code is not None and e.status_code < 500 and e.status_code != 429):
+                    raise
+            except OSError:
+                if attempt == max_retries:
+                    raise
+            time.sleep(min(0.5 * 2 ** (attempt - 1), 10))
+
+        etag = res.headers.get("ETag", "")
+        record_upload_part(session_id, part_number, etag, length)
+        done[part_number] = etag
+        sent += length
+
+    parts_xml = "".join(
+        f"<Part><PartNumber>{n}</PartNumber><ETag>{done[n]}</ETag></Part>" for n in sorted(done)
+    )
+    res = session.post(key, params={"uploadId": upload_id},
+                       data=f"<CompleteMultipartUpload>{parts_xml}</CompleteMultipartUpload>",
+                       headers={"Content-Type": "application/xml"}, timeout=client.timeout)
+    _check(res, "CompleteMultipartUpload")
+    complete_upload_session(session_id)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "bytes": sent,
+        "seconds": elapsed,
+        "bytes_per_sec": sent / elapsed if elapsed > 0 else 0.0,
+        "parts": part_count,
+        "resumed_parts": resumed,
+    }
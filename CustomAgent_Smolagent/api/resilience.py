@@ -0,0 +1,144 @@
+"""resilience.py
+
+Retry and circuit-breaker policy for Datahub GraphQL calls.
+
+Transient failures (connection errors, timeouts, HTTP 408/425/429/5xx) are
+retried with exponential backoff and full jitter; a `Retry-After` header on
+the response sets the minimum wait. GraphQL `errors` entries are not retried,
+since they mean the request itself was rejected.
+
+The circuit breaker opens after `failure_threshold` consecutive transient
+failures and refuses calls with `CircuitOpenError` for `reset_timeout`
+seconds. After that a single probe call is let through; if it succeeds the
+circuit closes, otherwise it opens again.
+
+Defaults come from the environment:
+
+    CRDC_RETRY_ATTEMPTS       attempts per call, including the first (default 4)
+    CRDC_RETRY_BASE_DELAY     first backoff in seconds (default 0.5)
+    CRDC_RETRY_MAX_DELAY      cap on a single backoff (default 30)
+    CRDC_BREAKER_THRESHOLD    consecutive failures that open the circuit (default 5, 0 disables it)
+    CRDC_BREAKER_RESET        seconds the circuit stays open (default 30)
+"""
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import os
+import random
+import threading
+import time
+
+import requests
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 120.0
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"Circuit open after repeated failures; retry in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int | None = None, base_delay: float | None = None,
+                 max_delay: float | None = None):
+        self.max_attempts = max(1, max_attempts if max_attempts is not None
+                                else int(os.getenv("CRDC_RETRY_ATTEMPTS", "4")))
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv("CRDC_RETRY_BASE_DELAY", "0.5"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("CRDC_RETRY_MAX_DELAY", "30"))
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """Seconds to wait after failed attempt number `attempt` (1-based)."""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            backoff = max(backoff, min(retry_after, MAX_RETRY_AFTER))
+        return backoff
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def classify(exc: Exception) -> tuple[bool, int | None, float | None]:
+    """Returns (transient, HTTP status code, Retry-After seconds) for an exception from a call."""
+    response = getattr(exc, "response", None)
+    if isinstance(exc, requests.HTTPError) or (httpx is not None and isinstance(exc, httpx.HTTPStatusError)):
+        status = response.status_code if response is not None else None
+        retry_after = parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+        return status in RETRYABLE_STATUS, status, retry_after
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True, None, None
+    if httpx is not None and isinstance(exc, httpx.TransportError):
+        return True, None, None
+    return False, None, None
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int | None = None, reset_timeout: float | None = None):
+        self.failure_threshold = (failure_threshold if failure_threshold is not None
+                                  else int(os.getenv("CRDC_BREAKER_THRESHOLD", "5")))
+        self.reset_timeout = reset_timeout if reset_timeout is not None else float(os.getenv("CRDC_BREAKER_RESET", "30"))
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may be made now."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            # once the timeout has passed, exactly one caller gets to probe the endpoint
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(max(remaining, 0.0))
+            self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._probing = False
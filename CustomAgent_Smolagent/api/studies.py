@@ -0,0 +1,133 @@
+"""studies.py
+
+Cached lookup of the submitter's study IDs.
+
+`getMyUser` returns the same studies for the whole session, so the result is
+kept in memory for CRDC_STUDY_CACHE_TTL seconds (default 900) and shared by
+every thread. Concurrent callers that find the cache empty or stale wait for
+a single in-flight fetch instead of each calling the API. With
+CRDC_STUDY_CACHE_PERSIST=1 (the default) the list is also stored in
+feedback.db, so a new process within the TTL does not need to call the API
+either. Set CRDC_STUDY_CACHE_TTL=0 to disable caching.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from api.client import get_client
+from db.db import get_cached_studies, put_cached_studies, delete_cached_studies
+
+DEFAULT_TTL = 900.0
+
+QUERY = """
+query getMyUser {
+  getMyUser {
+    _id
+    studies {
+      _id
+      createdAt
+    }
+  }
+}
+"""
+
+
+def sort_by_recency(studies: list[dict]) -> list[str]:
+    """Study IDs, newest `createdAt` first; studies without a date keep API order after dated ones."""
+    dated = sorted((s for s in studies if s.get("createdAt")), key=lambda s: s["createdAt"], reverse=True)
+    undated = [s for s in studies if not s.get("createdAt")]
+    return [s["_id"] for s in dated + undated]
+
+
+class StudyCache:
+    def __init__(self, ttl: float | None = None, persist: bool | None = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("CRDC_STUDY_CACHE_TTL", DEFAULT_TTL))
+        if persist is None:
+            persist = os.getenv("CRDC_STUDY_CACHE_PERSIST", "1") == "1"
+        self.persist = persist
+        # cache_key -> (study_ids, fetched_at)
+        self._entries: dict[str, tuple[list[str], float]] = {}
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "fetches": 0}
+
+    @staticmethod
+    def cache_key() -> str:
+        """Entries are per endpoint and submitter; only a hash of the token is kept."""
+        client = get_client()
+        token_hash = hashlib.sha256((client.token or "").encode()).hexdigest()[:16]
+        return f"{client.api_url}|{token_hash}"
+
+    def _fresh(self, key: str) -> list[str] | None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.persist:
+            entry = get_cached_studies(key)
+            if entry is not None:
+                with self._lock:
+                    self._entries[key] = entry
+        if entry is not None and now - entry[1] < self.ttl:
+            return list(entry[0])
+        return None
+
+    def get(self, refresh: bool = False) -> tuple[list[str], bool]:
+        """Returns (study IDs most recent first, whether they came from the cache)."""
+        key = self.cache_key()
+        if not refresh and self.ttl > 0:
+            ids = self._fresh(key)
+            if ids is not None:
+                self._count("hits")
+                return ids, True
+
+        with self._fetch_lock:
+            # another thread may have fetched while this one waited
+            if not refresh and self.ttl > 0:
+                ids = self._fresh(key)
+                if ids is not None:
+                    self._count("hits")
+                    return ids, True
+            self._count("misses")
+            data = get_client().execute(QUERY, operation="getMyUser")
+            self._count("fetches")
+            ids = sort_by_recency(data["getMyUser"]["studies"] or [])
+            fetched_at = time.time()
+            with self._lock:
+                self._entries[key] = (ids, fetched_at)
+            if self.persist and self.ttl > 0:
+                put_cached_studies(key, ids, fetched_at)
+            return list(ids), False
+
+    def invalidate(self, all_users: bool = False) -> None:
+        """Forget the current submitter's studies (or everyone's), e.g. after a new study is approved."""
+        key = None if all_users else self.cache_key()
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        if self.persist:
+            delete_cached_studies(key)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+_cache: StudyCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_study_cache() -> StudyCache:
+    """Return the process-wide study cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = StudyCache()
+    return _cache
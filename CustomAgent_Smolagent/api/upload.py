@@ -0,0 +1,153 @@
+"""upload.py
+
+Streaming PUT of local files to presigned URLs.
+
+The file is never read into memory as a whole: the body is fed to the
+connection in fixed-size chunks from a file handle (or a memory map), with an
+explicit Content-Length so S3 presigned PUTs accept it. Peak memory is one
+chunk per upload regardless of file size.
+"""
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+import mimetypes
+import mmap
+import os
+import time
+
+from api.client import get_client
+from tracing.spans import span
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ChunkedFileReader:
+    """
+    Request body that iterates over a file in `chunk_size` pieces.
+    `__len__` lets requests set Content-Length instead of chunked encoding.
+    """
+
+    def __init__(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, use_mmap: bool = False,
+                 offset: int = 0, length: int | None = None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._fh = open(path, "rb")
+        size = os.fstat(self._fh.fileno()).st_size
+        self._start = offset
+        self._end = size if length is None else min(size, offset + length)
+        self._pos = self._start
+        self._mmap = None
+        if use_mmap and self._end > self._start:
+            self._mmap = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._fh.seek(self._start)
+        self.bytes_sent = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __iter__(self):
+        while True:
+            chunk = self.read_chunk()
+            if not chunk:
+                return
+            yield chunk
+
+    def read_chunk(self) -> bytes:
+        remaining = self._end - self._pos
+        if remaining <= 0:
+            return b""
+        n = min(self.chunk_size, remaining)
+        if self._mmap is not None:
+            chunk = self._mmap[self._pos:self._pos + n]
+        else:
+            chunk = self._fh.read(n)
+        self._pos += len(chunk)
+        self.bytes_sent += len(chunk)
+        return chunk
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def object_key(url: str) -> str:
+    """The object URL without its query string (signatures change, the object does not)."""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+
+
+def signed_url_expiry(url: str) -> float | None:
+    """
+    Unix time at which a presigned URL stops working, or None if the URL does not say.
+    Understands SigV4 (`X-Amz-Date` + `X-Amz-Expires`) and SigV2/CloudFront (`Expires`).
+    """
+    query = {k.lower(): v for k, v in parse_qsl(urlsplit(url).query)}
+    if "x-amz-date" in query and "x-amz-expires" in query:
+        try:
+            signed = datetime.strptime(query["x-amz-date"], "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+            return signed.timestamp() + int(query["x-amz-expires"])
+        except ValueError:
+            return None
+    if "expires" in query:
+        try:
+            return float(query["expires"])
+        except ValueError:
+            return None
+    return None
+
+
+def guess_content_type(file_path: str) -> str:
+    mime_type, _ = mimetypes.guess_type(file_path)
+    return mime_type or "application/octet-stream"
+
+
+def stream_put(url: str, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+               use_mmap: bool = False, content_type: str | None = None) -> dict:
+    """
+    Upload `file_path` to `url` with a streamed PUT.
+    Returns {"bytes", "seconds", "bytes_per_sec", "status_code"}.
+    """
+    session = get_client().session
+    start = time.perf_counter()
+    with ChunkedFileReader(file_path, chunk_size=chunk_size, use_mmap=use_mmap) as body, \
+            span("upload PUT", "http", file=os.path.basename(file_path)) as s:
+        headers = {
+            "Content-Type": content_type or guess_content_type(file_path),
+            "Content-Length": str(len(body)),
+        }
+        # an empty iterable would make requests fall back to chunked encoding
+        res = session.put(url, data=body if len(body) else b"", headers=headers,
+                          timeout=get_client().timeout)
+        sent = len(body)
+        if s is not None:
+            s.set(status_code=res.status_code)
+            s.add_bytes(sent)
+            if not res.ok:
+                s.fail(f"HTTP {res.status_code}")
+    elapsed = time.perf_counter() - start
+    if not res.ok:
+        raise UploadError(f"Error uploading file {file_path}: {res.status_code} {res.text}", res.status_code)
+    return {
+        "bytes": sent,
+        "seconds": elapsed,
+        "bytes_per_sec": sent / elapsed if elapsed > 0 else 0.0,
+        "status_code": res.status_code,
+    }
+
+
+def format_rate(bytes_per_sec: float) -> str:
+    return f"{bytes_per_sec / (1024 * 1024):.2f} MB/s"
@@ -0,0 +1,133 @@
+"""bench_db_lookups.py
+
+Lookup latency of the hot db helpers before and after the index migration.
+
+Builds a temporary feedback.db at schema version 2 (no secondary indexes),
+fills it with `--feedback-rows` feedback rows, times `get_file_id` and
+`get_feedback_for_tool`, then applies the remaining migrations and times the
+same lookups again. `get_file_id` is timed with an empty in-process id cache
+(the indexed query) and again on cache hits, so the two effects show separately.
+
+    python benchmarks/bench_db_lookups.py --feedback-rows 1000000
+"""
+from pathlib import Path
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import db
+from tracing.spans import set_enabled
+
+TOOLS = ["PrepareMetadata", "CreateBatch", "upload_file", "update_batch", "CreateSubmission",
+         "GetMyStudies", "GenerateSubmissionName", "upload_batch"]
+FILES_PER_SUBMISSION = 5
+
+
+def populate(feedback_rows: int, submissions: int) -> None:
+    conn = db.connect()
+    with conn:
+        conn.executemany("INSERT INTO submissions (submission_name) VALUES (?)",
+                         ((f"sub_{i:07d}",) for i in range(submissions)))
+        conn.executemany("INSERT INTO files (submission_id, file_name, full_path) VALUES (?, ?, ?)",
+                         ((s + 1, f"file_{f}.tsv", f"/tmp/sub_{s:07d}/file_{f}.tsv")
+                          for s in range(submissions) for f in range(FILES_PER_SUBMISSION)))
+    file_count = submissions * FILES_PER_SUBMISSION
+    rnd = random.Random(0)
+    # GenerateSubmissionName is deliberately rare: that is the selective lookup
+    weights = [30, 20, 20, 20, 4, 4, 1, 1]
+    batch = 100_000
+    for start in range(0, feedback_rows, batch):
+        n = min(batch, feedback_rows - start)
+        with conn:
+            conn.executemany(
+                "INSERT INTO feedback (file_id, source, tool, is_accepted, comments) VALUES (?, 'system', ?, ?, ?)",
+                ((rnd.randint(1, file_count), rnd.choices(TOOLS, weights)[0], rnd.random() > 0.1,
+                  f"comment {start + i}") for i in range(n)),
+            )
+
+
+def time_lookups(submissions: int, iterations: int) -> dict:
+    rnd = random.Random(1)
+    keys = [(f"sub_{rnd.randrange(submissions):07d}", f"file_{rnd.randrange(FILES_PER_SUBMISSION)}.tsv")
+            for _ in range(iterations)]
+    # start from an empty in-process id cache so this pass measures the query itself
+    db._file_id_cache.clear()
+    start = time.perf_counter()
+    for sub, name in keys:
+        db.get_file_id(sub, name)
+    file_id_us = (time.perf_counter() - start) / iterations * 1e6
+
+    # the same keys again are all answered from the id cache
+    start = time.perf_counter()
+    for sub, name in keys:
+        db.get_file_id(sub, name)
+    cached_us = (time.perf_counter() - start) / iterations * 1e6
+    db._file_id_cache.clear()
+
+    tool_iterations = max(1, iterations // 100)
+    start = time.perf_counter()
+    for _ in range(tool_iterations):
+        rows = db.get_feedback_for_tool("GenerateSubmissionName")
+    tool_ms = (time.perf_counter() - start) / tool_iterations * 1e3
+    return {
+        "get_file_id_us": round(file_id_us, 2),
+        "get_file_id_cached_us": round(cached_us, 2),
+        "get_feedback_for_tool_ms": round(tool_ms, 3),
+        "get_feedback_for_tool_rows": len(rows),
+    }
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feedback-rows", type=int, default=1_000_000)
+    parser.add_argument("--submissions", type=int, default=20_000)
+    parser.add_argument("--iterations", type=int, default=2_000)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    # the version-2 schema has no spans table, and span overhead would blur the index comparison
+    set_enabled(False)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "bench.db"
+        db.init_schema(target_version=2)
+        start = time.perf_counter()
+        populate(args.feedback_rows, args.submissions)
+        populate_s = time.perf_counter() - start
+
+        before = time_lookups(args.submissions, args.iterations)
+        start = time.perf_counter()
+        version = db.init_schema()
+        migrate_s = time.perf_counter() - start
+        after = time_lookups(args.submissions, args.iterations)
+        db.close_connections()
+
+    result = {
+        "feedback_rows": args.feedback_rows,
+        "files": args.submissions * FILES_PER_SUBMISSION,
+        "populate_s": round(populate_s, 2),
+        "migrate_s": round(migrate_s, 2),
+        "schema_version": version,
+        "without_indexes": before,
+        "with_indexes": after,
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{args.feedback_rows} feedback rows, {result['files']} files "
+              f"(populate {populate_s:.1f}s, index migration {migrate_s:.1f}s)")
+        print(f"{'lookup':<28}{'no indexes':>14}{'indexes':>14}")
+        print(f"{'get_file_id (us)':<28}{before['get_file_id_us']:>14}{after['get_file_id_us']:>14}")
+        print(f"{'get_file_id cached (us)':<28}{before['get_file_id_cached_us']:>14}"
+              f"{after['get_file_id_cached_us']:>14}")
+        print(f"{'get_feedback_for_tool (ms)':<28}{before['get_feedback_for_tool_ms']:>14}"
+              f"{after['get_feedback_for_tool_ms']:>14}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
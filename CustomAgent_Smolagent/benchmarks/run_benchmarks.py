@@ -0,0 +1,371 @@
+"""run_benchmarks.py
+
+Benchmark suite for the tools and the scripted submission flow.
+
+Everything runs against the in-process mock Datahub (`mock_server.py`) and a
+temporary feedback.db, so no network access or token is needed:
+
+    prepare    PrepareAllMetadataTool throughput at 10 / 1k / 10k files
+    db         log_feedback, queue_feedback and get_file_id latency as the feedback table grows
+    upload     UploadFileTool MB/s and peak RSS per file size (each size in a fresh subprocess)
+    pipeline   end-to-end submissions per minute through scheduler.run_load
+    startup    import time of the tools, pipeline and entry-point modules (each in a fresh interpreter)
+
+Results are written as JSON (`--output`); `--compare OLD.json` prints the
+relative change of every number against an earlier run.
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --only upload --upload-sizes 1M,1G,5G --output big.json
+    python benchmarks/run_benchmarks.py --compare main.json --output bench.json
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from db import db
+
+SUITES = ("prepare", "db", "upload", "pipeline", "startup")
+SIZE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+TSV_ROW = "study\tphs000000\tMock study\tSample description\n"
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().upper()
+    if value[-1] in SIZE_UNITS:
+        return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+    return int(value)
+
+
+def peak_rss_bytes() -> int | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_templates(folder: Path, count: int, rows: int = 20) -> None:
+    folder.mkdir(parents=True, exist_ok=True)
+    body = "type\tstudy_id\tstudy_name\tstudy_description\n" + TSV_ROW * rows
+    for i in range(count):
+        (folder / f"sample_{i:05d}.tsv").write_text(body)
+
+
+def bench_prepare(tmp: Path, file_counts: list[int]) -> list[dict]:
+    from db.writer import flush_feedback
+    from tools.prepare_metadata import PrepareAllMetadataTool
+
+    tool = PrepareAllMetadataTool()
+    results = []
+    for count in file_counts:
+        src = tmp / f"prepare_src_{count}"
+        write_templates(src, count)
+        base = tmp / f"prepare_base_{count}"
+        runs = []
+        # both runs stage the same sources, so the second finds their hashes (and the page cache) warm
+        for label in ("cold", "warm"):
+            name = f"bench_prepare_{count}_{label}"
+            db.insert_submission(name)
+            # the tool prefers the base dir it learned from earlier feedback over the one passed in
+            db.set_learned_setting("PrepareMetadata", "base_dir", str(base))
+            start = time.perf_counter()
+            tool(folder_path=str(src), base_dir=str(base), submission_name=name, checksums=True)
+            flush_feedback()
+            elapsed = time.perf_counter() - start
+            runs.append({"run": label, "seconds": round(elapsed, 4), "files_per_sec": round(count / elapsed, 1)})
+        shutil.rmtree(base, ignore_errors=True)
+        shutil.rmtree(src, ignore_errors=True)
+        results.append({"files": count, "runs": runs})
+    return results
+
+
+def _grow_feedback(rows: int, file_count: int, rnd: random.Random) -> None:
+    conn = db.connect()
+    for start in range(0, rows, 100_000):
+        n = min(100_000, rows - start)
+        with conn:
+            conn.executemany(
+                "INSERT INTO feedback (file_id, source, tool, is_accepted, comments) VALUES (?, 'system', ?, ?, ?)",
+                ((rnd.randint(1, file_count), "upload_batch", True, "bench") for _ in range(n)),
+            )
+
+
+def bench_db(table_sizes: list[int], iterations: int) -> list[dict]:
+    from db.writer import flush_feedback, queue_feedback
+
+    submissions, files_per = 2_000, 5
+    for s in range(submissions):
+        db.insert_submission(f"bench_sub_{s}")
+        db.register_files(f"bench_sub_{s}", [{"fileName": f"file_{f}.tsv", "fullPath": f"/tmp/{s}/{f}"}
+                                             for f in range(files_per)])
+    rnd = random.Random(0)
+    results = []
+    current = db.connect().execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+    for size in sorted(table_sizes):
+        if size > current:
+            _grow_feedback(size - current, submissions * files_per, rnd)
+            current = size
+        keys = [(f"bench_sub_{rnd.randrange(submissions)}", f"file_{rnd.randrange(files_per)}.tsv")
+                for _ in range(iterations)]
+
+        start = time.perf_counter()
+        for i in range(iterations):
+            db.log_feedback(file_id=-1, source="system", is_accepted=True, comments=f"bench {i}", tool="bench")
+        log_us = (time.perf_counter() - start) / iterations * 1e6
+
+        start = time.perf_counter()
+        for sub, name in keys:
+            queue_feedback(source="system", tool="bench", is_accepted=True, comments="bench",
+                           submission_name=sub, file_name=name)
+        queue_us = (time.perf_counter() - start) / iterations * 1e6
+        flush_feedback()
+        queue_total_us = (time.perf_counter() - start) / iterations * 1e6
+
+        db._file_id_cache.clear()
+        start = time.perf_counter()
+        for sub, name in keys:
+            db.get_file_id(sub, name)
+        cold_us = (time.perf_counter() - start) / iterations * 1e6
+        start = time.perf_counter()
+        for sub, name in keys:
+            db.get_file_id(sub, name)
+        warm_us = (time.perf_counter() - start) / iterations * 1e6
+
+        current = db.connect().execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+        results.append({
+            "feedback_rows": size,
+            "log_feedback_us": round(log_us, 2),
+            "queue_feedback_us": round(queue_us, 2),
+            "queue_feedback_flushed_us": round(queue_total_us, 2),
+            "get_file_id_cold_us": round(cold_us, 2),
+            "get_file_id_warm_us": round(warm_us, 2),
+        })
+    return results
+
+
+def upload_child(args: argparse.Namespace) -> None:
+    """Runs in a fresh interpreter so peak RSS covers one upload only."""
+    from api.client import configure_client
+    from tools.upload_file import UploadFileTool
+
+    configure_client(api_url=args.api_url, token="bench")
+    baseline = peak_rss_bytes()
+    batch = json.loads(args.batch)
+    file_name = batch["files"][0]["fileName"]
+    start = time.perf_counter()
+    message = UploadFileTool()(batch=batch, submission_name="bench_upload", file_name=file_name,
+                               file_path=args.file)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"seconds": elapsed, "baseline_rss": baseline, "peak_rss": peak_rss_bytes(),
+                      "ok": message.startswith("Uploaded")}))
+
+
+def bench_upload(tmp: Path, server, sizes: list[int]) -> list[dict]:
+    submission = server.createSubmission({"studyID": server.studies[0]["_id"], "dataCommons": "CDS",
+                                          "name": "bench_upload", "intention": "New/Update",
+                                          "dataType": "Metadata Only"})
+    results = []
+    for size in sizes:
+        path = tmp / f"upload_{size}.bin"
+        with open(path, "wb") as f:
+            # sparse file: no disk space or write time, and reads still go through the page cache
+            f.truncate(size)
+        batch = server.createBatch({"submissionID": submission["_id"], "files": [path.name]})
+        env = dict(os.environ, FEEDBACK_DB_PATH=str(db.DB_PATH))
+        proc = subprocess.run(
+            [sys.executable, __file__, "--upload-child", "--api-url", server.url, "--file", str(path),
+             "--batch", json.dumps(batch)],
+            cwd=ROOT, env=env, capture_output=True, text=True,
+        )
+        path.unlink()
+        if proc.returncode != 0:
+            results.append({"bytes": size, "error": proc.stderr.strip().splitlines()[-1:]})
+            continue
+        child = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append({
+            "bytes": size,
+            "ok": child["ok"],
+            "seconds": round(child["seconds"], 4),
+            "mb_per_sec": round(size / child["seconds"] / 1024 ** 2, 1) if child["seconds"] > 0 else None,
+            "baseline_rss_mb": round(child["baseline_rss"] / 1024 ** 2, 1) if child["baseline_rss"] else None,
+            "peak_rss_mb": round(child["peak_rss"] / 1024 ** 2, 1) if child["peak_rss"] else None,
+        })
+    return results
+
+
+def bench_pipeline(tmp: Path, runs: int, workers: int, files: int) -> dict:
+    from db.writer import flush_feedback
+    from pipeline import PipelineConfig
+    from scheduler import run_load
+
+    src = tmp / "pipeline_src"
+    write_templates(src, files)
+    base = tmp / "pipeline_base"
+    db.set_learned_setting("PrepareMetadata", "base_dir", str(base))
+    configs = [PipelineConfig(folder_path=str(src), base_dir=str(base), llm_fallback=False)
+               for _ in range(runs)]
+    report = run_load(configs, workers)
+    flush_feedback()
+    # every pool run starts fresh threads; their db connections must close with them
+    connections = [db.open_connection_count()]
+    run_load(configs[:workers * 2], workers)
+    flush_feedback()
+    connections.append(db.open_connection_count())
+    if connections[1] > connections[0]:
+        raise RuntimeError(f"Open db connections grew from {connections[0]} to {connections[1]} across pool runs")
+    return {
+        "submissions": report["submissions"],
+        "succeeded": report["succeeded"],
+        "workers": workers,
+        "files_per_submission": files,
+        "wall_s": round(report["wall_s"], 3),
+        "submissions_per_min": round(report["submissions_per_min"], 1),
+        "stages_p50_ms": {k: round(v["p50_s"] * 1e3, 2) for k, v in report["stages"].items()},
+        "open_db_connections": connections[-1],
+    }
+
+
+def import_ms(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1]) * 1e3
+
+
+def bench_startup(modules: list[str], runs: int) -> list[dict]:
+    results = []
+    for module in modules:
+        times = sorted(import_ms(module) for _ in range(runs))
+        results.append({
+            "module": module,
+            "median_ms": round(times[len(times) // 2], 1),
+            "min_ms": round(times[0], 1),
+        })
+    return results
+
+
+def flatten(obj, prefix: str = "") -> dict[str, float]:
+    """Numeric leaves keyed by path; list items are keyed by their first field (e.g. files=1000)."""
+    out = {}
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            out.update(flatten(v, f"{prefix}.{k}" if prefix else k))
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            label = str(i)
+            if isinstance(v, dict) and v:
+                first_key = next(iter(v))
+                label = f"{first_key}={v[first_key]}"
+            out.update(flatten(v, f"{prefix}[{label}]"))
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        out[prefix] = obj
+    return out
+
+
+def compare(old: dict, new: dict) -> None:
+    before, after = flatten(old.get("results", {})), flatten(new.get("results", {}))
+    print(f"\nChange vs {old.get('commit') or 'previous run'}:")
+    for key in sorted(after.keys() & before.keys()):
+        if before[key]:
+            print(f"  {key:<70}{before[key]:>12}{after[key]:>12}{(after[key] / before[key] - 1) * 100:>+9.1f}%")
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(SUITES), help=f"comma-separated subset of {','.join(SUITES)}")
+    parser.add_argument("--prepare-files", default="10,1000,10000")
+    parser.add_argument("--db-rows", default="0,10000,100000,1000000", help="feedback table sizes to measure at")
+    parser.add_argument("--db-iterations", type=int, default=2000)
+    parser.add_argument("--upload-sizes", default="1M,64M,512M", help="e.g. 1M,1G,5G")
+    parser.add_argument("--pipeline-runs", type=int, default=50)
+    parser.add_argument("--pipeline-workers", type=int, default=8)
+    parser.add_argument("--pipeline-files", type=int, default=5)
+    parser.add_argument("--startup-modules", default="tools,tools.upload_batch,pipeline,scheduler,CustomAgent,smolagents")
+    parser.add_argument("--startup-runs", type=int, default=7)
+    parser.add_argument("--latency", type=float, default=0.0, help="mock GraphQL latency in seconds")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="mock upload bandwidth in MB/s")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    # internal: one upload in a child process
+    parser.add_argument("--upload-child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--api-url", help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    parser.add_argument("--batch", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.upload_child:
+        upload_child(args)
+        return {}
+
+    suites = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    from api.client import configure_client
+    from mock_server import MockServer
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp = Path(tmp_dir)
+        db.DB_PATH = tmp / "bench.db"
+        db.init_schema()
+        with MockServer(latency=args.latency, bandwidth=args.bandwidth) as server:
+            configure_client(api_url=server.url, token="bench")
+            for suite in suites:
+                start = time.perf_counter()
+                print(f"Running {suite} benchmark...", file=sys.stderr)
+                if suite == "prepare":
+                    results[suite] = bench_prepare(tmp, [int(n) for n in args.prepare_files.split(",")])
+                elif suite == "db":
+                    results[suite] = bench_db([int(n) for n in args.db_rows.split(",")], args.db_iterations)
+                elif suite == "upload":
+                    results[suite] = bench_upload(tmp, server, [parse_size(s) for s in args.upload_sizes.split(",")])
+                elif suite == "pipeline":
+                    results[suite] = bench_pipeline(tmp, args.pipeline_runs, args.pipeline_workers,
+                                                    args.pipeline_files)
+                elif suite == "startup":
+                    results[suite] = bench_startup(args.startup_modules.split(","), args.startup_runs)
+                print(f"  done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        db.close_connections()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("upload_child", "api_url", "file", "batch")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,162 @@
 from pathlib import Path
+import atexit
+import json
+import os
 import sqlite3
+import threading
+import weakref
+
+from tracing.spans import traced
 
 BASE_DIR = Path(__file__).parent
-DB_PATH  = BASE_DIR / "feedback.db"
-SCHEMA   = BASE_DIR / "feedback_schema.sql"
+DB_PATH  = Path(os.getenv("FEEDBACK_DB_PATH", BASE_DIR / "feedback.db"))
+MIGRATIONS_DIR = BASE_DIR / "migrations"
+
+_local = threading.local()
+_open_conns: set[sqlite3.Connection] = set()
+_open_conns_lock = threading.Lock()
+# bumped by close_connections(); a thread whose connection is from an older generation reopens
+_conn_generation = 0
+
+# (submission_name, file_name) -> files.id; file rows are never updated, so entries stay valid
+_file_id_cache: dict[tuple[str, str], int] = {}
+_file_id_cache_lock = threading.Lock()
+_FILE_ID_CACHE_MAX = 200_000
+
+# (tool, key) -> learned value, None if nothing was learned; cleared whenever this process writes feedback
+_learned_cache: dict[tuple[str, str], str | None] = {}
+_learned_generation = 0
+
+# called with no arguments after this process commits feedback rows (see add_feedback_listener)
+_feedback_listeners: list = []
+
+
+def _open(path) -> sqlite3.Connection:
+    # cached_statements keeps prepared statements around for the life of the connection
+    conn = sqlite3.connect(path, timeout=30, cached_statements=256, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+class _ThreadConnection:
+    """A thread's connection. Held only by the thread's local storage, so it goes away with the thread."""
+    __slots__ = ("conn", "pid", "path", "generation", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection, generation: int):
+        self.conn, self.pid, self.path, self.generation = conn, os.getpid(), str(DB_PATH), generation
+
 
-def connect():
-    return sqlite3.connect(DB_PATH)
+def _forget(conn: sqlite3.Connection, pid: int) -> None:
+    # a forked child must not close the parent's connection
+    if pid != os.getpid():
+        return
+    with _open_conns_lock:
+        _open_conns.discard(conn)
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def connect() -> sqlite3.Connection:
+    """
+    Return the calling thread's long-lived connection to DB_PATH, opening it on first use.
+    Connections run in WAL mode with synchronous=NORMAL so concurrent readers and writers
+    from several threads or processes don't hit `database is locked`, and commits don't fsync.
+    A forked child opens its own connection instead of reusing the parent's, and a thread
+    whose connection was closed by `close_connections()` opens a new one. A connection is
+    closed when its thread exits, so short-lived pool threads don't leave it open.
+    Use as `with connect() as conn:` to commit (or roll back) a transaction.
+    """
+    held = getattr(_local, "held", None)
+    if (held is None or held.pid != os.getpid() or held.path != str(DB_PATH)
+            or held.generation != _conn_generation):
+        conn = _open(DB_PATH)
+        with _open_conns_lock:
+            _open_conns.add(conn)
+            held = _ThreadConnection(conn, _conn_generation)
+        # runs when the thread's local storage (or a replaced connection) is released
+        weakref.finalize(held, _forget, conn, held.pid)
+        _local.held = held
+    return held.conn
+
+
+def open_connection_count() -> int:
+    """Number of connections this process currently has open (one per live thread that used the db)."""
+    with _open_conns_lock:
+        return len(_open_conns)
+
+
+def close_connections() -> None:
+    """
+    Close every connection opened by this process. Every thread, not just the caller,
+    opens a fresh connection on its next `connect()`.
+    """
+    global _conn_generation
+    with _open_conns_lock:
+        conns = list(_open_conns)
+        _open_conns.clear()
+        _conn_generation += 1
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _local.held = None
 
-def init_schema():
-    with connect() as conn, open(SCHEMA, "r") as ddl:
-        conn.executescript(ddl.read())
 
+atexit.register(close_connections)
+
+def list_migrations() -> list[tuple[int, Path]]:
+    """Migration files as (version, path), ordered by version. Files are named NNNN_description.sql."""
+    migrations = []
+    for path in MIGRATIONS_DIR.glob("*.sql"):
+        version = int(path.name.split("_", 1)[0])
+        migrations.append((version, path))
+    return sorted(migrations)
+
+
+def _split_sql(script: str) -> list[str]:
+    statements, buf = [], ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            statements.append(buf.strip())
+            buf = ""
+    if buf.strip():
+        statements.append(buf.strip())
+    return statements
+
+
+@traced(kind="db")
+def init_schema(target_version: int | None = None) -> int:
+    """
+    Apply every migration newer than the database's `PRAGMA user_version`, each in
+    its own transaction, and return the resulting version. `target_version` stops
+    early (used by benchmarks to compare schema versions).
+    """
+    conn = connect()
+    for version, path in list_migrations():
+        if target_version is not None and version > target_version:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # another process may have applied it while we waited for the lock
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                conn.rollback()
+                continue
+            for statement in _split_sql(path.read_text()):
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+@traced(kind="db")
 def save_submission(submission_name: str, files: list[dict]) -> int:
     """
     Insert a row into `submissions` and its related file rows.
@@ -30,6 +175,7 @@ def save_submission(submission_name: str, files: list[dict]) -> int:
         )
     return submission_id
 
+@traced(kind="db")
 def log_feedback(file_id: int, source: str, is_accepted: bool, comments: str, tool: str) -> None:
     """Insert a feedback record including tool and prompt_template."""
     with connect() as conn:
@@ -40,26 +186,86 @@ def log_feedback(file_id: int, source: str, is_accepted: bool, comments: str, to
             """,
             (file_id, source, tool, is_accepted, comments),
         )
+    feedback_written()
         
 def get_file_id(submission_name: str, file_name: str) -> int:
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    cached = _file_id_cache.get((submission_name, file_name))
+    if cached is not None:
+        return cached
+
+    file_id = _load_file_id(submission_name, file_name)
+    if file_id is not None:
+        _cache_file_ids(submission_name, {file_name: file_id})
+        return file_id
+    else:
+        raise ValueError(f"No file found for submission '{submission_name}' and file '{file_name}'")
+
 
-    cursor.execute("""
+# only cache misses are traced; a span costs far more than the dict lookup it would time
+@traced(kind="db")
+def _load_file_id(submission_name: str, file_name: str) -> int | None:
+    row = connect().execute("""
         SELECT files.id
         FROM files
         JOIN submissions ON files.submission_id = submissions.id
         WHERE submissions.submission_name = ? AND files.file_name = ?
-    """, (submission_name, file_name))
-    
-    row = cursor.fetchone()
-    conn.close()
+    """, (submission_name, file_name)).fetchone()
+    return row[0] if row else None
+
+
+@traced(kind="db")
+def get_file_ids(submission_name: str) -> dict[str, int]:
+    """Returns {file_name: file_id} for every file of a submission in one query."""
+    rows = connect().execute("""
+        SELECT files.file_name, MIN(files.id)
+        FROM files
+        JOIN submissions ON files.submission_id = submissions.id
+        WHERE submissions.submission_name = ?
+        GROUP BY files.file_name
+    """, (submission_name,)).fetchall()
+    ids = dict(rows)
+    _cache_file_ids(submission_name, ids)
+    return ids
+
+
+@traced(kind="db")
+def register_files(submission_name: str, files: list[dict]) -> dict[str, int]:
+    """
+    Insert file rows for an existing submission in one transaction.
+    `files` is a list of dicts with keys 'fileName' and 'fullPath'.
+    Returns {file_name: file_id} for all files of the submission and caches it,
+    so later `get_file_id` calls don't touch the database.
+    """
+    with connect() as conn:
+        row = conn.execute("SELECT id FROM submissions WHERE submission_name = ?", (submission_name,)).fetchone()
+        if row is None:
+            raise ValueError(f"Submission name {submission_name} not found in database")
+        submission_id = row[0]
+        conn.executemany(
+            "INSERT INTO files (submission_id, file_name, full_path) VALUES (?, ?, ?)",
+            [(submission_id, f["fileName"], f["fullPath"]) for f in files],
+        )
+        rows = conn.execute(
+            "SELECT file_name, MIN(id) FROM files WHERE submission_id = ? GROUP BY file_name",
+            (submission_id,),
+        ).fetchall()
+    ids = dict(rows)
+    _cache_file_ids(submission_name, ids)
+    return ids
+
+
+def cached_file_id(submission_name: str, file_name: str) -> int | None:
+    """The file id if it is already cached in this process, without querying."""
+    return _file_id_cache.get((submission_name, file_name))
+
+
+def _cache_file_ids(submission_name: str, ids: dict[str, int]) -> None:
+    with _file_id_cache_lock:
+        if len(_file_id_cache) > _FILE_ID_CACHE_MAX:
+            _file_id_cache.clear()
+        for name, file_id in ids.items():
+            _file_id_cache.setdefault((submission_name, name), file_id)
 
-    if row:
-        return row[0]
-    else:
-        raise ValueError(f"No file found for submission '{submission_name}' and file '{file_name}'")
-    
 def insert_file(submission_name: str, file_name: str, full_path: str) -> int:
     with connect() as conn:
         # Get submission id from submission_name
@@ -90,6 +296,7 @@ def insert_submission(submission_name: str) -> int:
         return cur.lastrowid
     
     
+@traced(kind="db")
 def get_feedback_for_tool(tool: str, file_name: str | None = None) -> list[tuple[str, bool, str]]:
     """
     Returns a list of (source, is_accepted, comments) for a specific tool,
@@ -114,3 +321,277 @@ def get_feedback_for_tool(tool: str, file_name: str | None = None) -> list[tuple
         
         return cursor.fetchall()
 
+
+
+def find_upload_session(object_key: str, file_path: str, file_size: int, file_mtime: float) -> tuple[int, str, int] | None:
+    """
+    Return (session_id, upload_id, part_size) of an unfinished multipart upload
+    of the same, unchanged file to the same object, or None.
+    """
+    with connect() as conn:
+        row = conn.execute("""
+            SELECT id, upload_id, part_size
+            FROM upload_sessions
+            WHERE object_key = ? AND file_path = ? AND file_size = ? AND file_mtime = ? AND completed = 0
+            ORDER BY id DESC
+            LIMIT 1
+        """, (object_key, file_path, file_size, file_mtime)).fetchone()
+    return tuple(row) if row else None
+
+
+def create_upload_session(object_key: str, file_path: str, file_size: int, file_mtime: float,
+                          part_size: int, upload_id: str) -> int:
+    with connect() as conn:
+        cur = conn.execute(
+            """
+            INSERT INTO upload_sessions (object_key, file_path, file_size, file_mtime, part_size, upload_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (object_key, file_path, file_size, file_mtime, part_size, upload_id),
+        )
+        return cur.lastrowid
+
+
+def get_uploaded_parts(session_id: int) -> dict[int, str]:
+    """Returns {part_number: etag} for parts already stored by the server."""
+    with connect() as conn:
+        rows = conn.execute(
+            "SELECT part_number, etag FROM upload_parts WHERE session_id = ?",
+            (session_id,),
+        ).fetchall()
+    return dict(rows)
+
+
+def record_upload_part(session_id: int, part_number: int, etag: str, size: int) -> None:
+    with connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO upload_parts (session_id, part_number, etag, size) VALUES (?, ?, ?, ?)",
+            (session_id, part_number, etag, size),
+        )
+
+
+def complete_upload_session(session_id: int) -> None:
+    with connect() as conn:
+        conn.execute("UPDATE upload_sessions SET completed = 1 WHERE id = ?", (session_id,))
+
+
+def get_file_hash(path: str) -> tuple[int, int, str] | None:
+    """Returns (size, mtime_ns, sha256) last recorded for `path`, or None."""
+    row = connect().execute(
+        "SELECT size, mtime_ns, sha256 FROM file_hashes WHERE path = ?", (path,)
+    ).fetchone()
+    return tuple(row) if row else None
+
+
+@traced(kind="db")
+def put_file_hashes(rows: list[tuple[str, int, int, str]]) -> None:
+    """Record (path, size, mtime_ns, sha256) rows, replacing older entries for the same path."""
+    with connect() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+
+def get_cached_studies(cache_key: str) -> tuple[list[str], float] | None:
+    """Returns (study_ids, fetched_at) stored for `cache_key`, or None."""
+    row = connect().execute(
+        "SELECT study_ids, fetched_at FROM study_cache WHERE cache_key = ?", (cache_key,)
+    ).fetchone()
+    return (json.loads(row[0]), row[1]) if row else None
+
+
+def put_cached_studies(cache_key: str, study_ids: list[str], fetched_at: float) -> None:
+    with connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO study_cache (cache_key, study_ids, fetched_at) VALUES (?, ?, ?)",
+            (cache_key, json.dumps(study_ids), fetched_at),
+        )
+
+
+def delete_cached_studies(cache_key: str | None = None) -> None:
+    """Drop the stored study list for `cache_key`, or every stored list."""
+    with connect() as conn:
+        if cache_key is None:
+            conn.execute("DELETE FROM study_cache")
+        else:
+            conn.execute("DELETE FROM study_cache WHERE cache_key = ?", (cache_key,))
+
+
+def get_api_response(idempotency_key: str) -> dict | None:
+    """The stored result of an earlier successful call with this key, or None."""
+    row = connect().execute(
+        "SELECT response FROM api_requests WHERE idempotency_key = ?", (idempotency_key,)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def put_api_response(idempotency_key: str, operation: str, response: dict) -> None:
+    with connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO api_requests (idempotency_key, operation, response) VALUES (?, ?, ?)",
+            (idempotency_key, operation, json.dumps(response)),
+        )
+
+
+def save_workflow_state(submission_name: str, config: str, result: str, status: str) -> None:
+    """Store the JSON config and result of a run under its submission name."""
+    with connect() as conn:
+        conn.execute(
+            """
+            INSERT INTO workflow_state (submission_name, config, result, status) VALUES (?, ?, ?, ?)
+            ON CONFLICT (submission_name) DO UPDATE SET
+                config = excluded.config, result = excluded.result, status = excluded.status,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (submission_name, config, result, status),
+        )
+
+
+def load_workflow_state(submission_name: str) -> tuple[str, str, str] | None:
+    """Returns (config JSON, result JSON, status) for a run, or None."""
+    row = connect().execute(
+        "SELECT config, result, status FROM workflow_state WHERE submission_name = ?", (submission_name,)
+    ).fetchone()
+    return tuple(row) if row else None
+
+
+@traced(kind="db")
+def save_workflow_files(submission_name: str, files: list[dict]) -> None:
+    """
+    Record the batch and signed URL of each file (dicts with file_name, full_path, batch_id,
+    signed_url, url_expires_at). Upload status is reset to pending for the given files.
+    """
+    with connect() as conn:
+        conn.executemany(
+            """
+            INSERT INTO workflow_files
+                (submission_name, file_name, full_path, batch_id, signed_url, url_expires_at, upload_status)
+            VALUES (?, ?, ?, ?, ?, ?, 'pending')
+            ON CONFLICT (submission_name, file_name) DO UPDATE SET
+                full_path = excluded.full_path, batch_id = excluded.batch_id,
+                signed_url = excluded.signed_url, url_expires_at = excluded.url_expires_at,
+                upload_status = 'pending', error = NULL, updated_at = CURRENT_TIMESTAMP
+            """,
+            [(submission_name, f["file_name"], f["full_path"], f.get("batch_id"), f.get("signed_url"),
+              f.get("url_expires_at")) for f in files],
+        )
+
+
+@traced(kind="db")
+def get_workflow_files(submission_name: str) -> list[dict]:
+    cur = connect().execute(
+        """
+        SELECT file_name, full_path, batch_id, signed_url, url_expires_at, upload_status, error
+        FROM workflow_files WHERE submission_name = ? ORDER BY file_name
+        """,
+        (submission_name,),
+    )
+    cols = [c[0] for c in cur.description]
+    return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+
+def set_workflow_file_status(submission_name: str, file_name: str, status: str, error: str | None = None) -> None:
+    """Update one file's upload status; a no-op for files that are not part of a recorded run."""
+    with connect() as conn:
+        conn.execute(
+            """
+            UPDATE workflow_files SET upload_status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE submission_name = ? AND file_name = ?
+            """,
+            (status, error, submission_name, file_name),
+        )
+
+
+def get_learned_setting(tool: str, key: str, default: str | None = None) -> str | None:
+    """
+    The value `tool` learned for `key` from its feedback (see the triggers in the
+    learned_settings migration), or `default`. Served from an in-process cache after the
+    first lookup; values written by other processes show up once this process writes feedback.
+    """
+    try:
+        value = _learned_cache[(tool, key)]
+    except KeyError:
+        generation = _learned_generation
+        value = _load_learned_setting(tool, key)
+        # don't cache a value read while a feedback write was being committed
+        if generation == _learned_generation:
+            _learned_cache[(tool, key)] = value
+    return default if value is None else value
+
+
+@traced(kind="db")
+def _load_learned_setting(tool: str, key: str) -> str | None:
+    row = connect().execute(
+        "SELECT value FROM learned_settings WHERE tool = ? AND key = ?", (tool, key)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def set_learned_setting(tool: str, key: str, value: str | None) -> None:
+    """Set (or with None, forget) a learned value directly, e.g. to correct a bad one."""
+    with connect() as conn:
+        if value is None:
+            conn.execute("DELETE FROM learned_settings WHERE tool = ? AND key = ?", (tool, key))
+        else:
+            conn.execute(
+                "INSERT OR REPLACE INTO learned_settings (tool, key, value) VALUES (?, ?, ?)", (tool, key, value)
+            )
+    invalidate_learned_settings()
+
+
+def invalidate_learned_settings() -> None:
+    """Drop the in-process cache after feedback (and so possibly a learned value) was written."""
+    global _learned_generation
+    _learned_generation += 1
+    _learned_cache.clear()
+
+
+def add_feedback_listener(listener) -> None:
+    """Call `listener()` whenever this process has committed new feedback rows."""
+    if listener not in _feedback_listeners:
+        _feedback_listeners.append(listener)
+
+
+def feedback_written() -> None:
+    invalidate_learned_settings()
+    for listener in list(_feedback_listeners):
+        try:
+            listener()
+        except Exception as e:
+            print(f"Warning: feedback listener {getattr(listener, '__qualname__', listener)} failed: {e}")
+
+
+@traced(kind="db")
+def latest_failure_id(tools: list[str]) -> int:
+    """Id of the newest rejected feedback row of any of `tools`, 0 if there is none."""
+    conn = connect()
+    latest = 0
+    for tool in tools:
+        row = conn.execute("SELECT MAX(id) FROM feedback WHERE tool = ? AND is_accepted = 0", (tool,)).fetchone()
+        latest = max(latest, row[0] or 0)
+    return latest
+
+
+@traced(kind="db")
+def recent_failures(tool: str, limit: int) -> list[tuple[str, str]]:
+    """(comments, ts) of the newest `limit` rejected feedback rows of `tool`, newest first."""
+    return connect().execute(
+        "SELECT comments, ts FROM feedback WHERE tool = ? AND is_accepted = 0 ORDER BY id DESC LIMIT ?",
+        (tool, limit),
+    ).fetchall()
+
+
+def get_prompt_context(cache_key: str) -> tuple[int, str] | None:
+    """(feedback_id, text) stored for `cache_key`, or None."""
+    return connect().execute(
+        "SELECT feedback_id, text FROM prompt_context_cache WHERE cache_key = ?", (cache_key,)
+    ).fetchone()
+
+
+def put_prompt_context(cache_key: str, feedback_id: int, text: str) -> None:
+    with connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO prompt_context_cache (cache_key, feedback_id, text) VALUES (?, ?, ?)",
+            (cache_key, feedback_id, text),
+        )
@@ -0,0 +1,89 @@
+"""failure_context.py
+
+Short summaries of past tool failures for agent prompts.
+
+`failure_context(tools)` reads each tool's recent rejected feedback, groups it
+by normalised message (the same normalisation as the feedback index, so one
+failure on many files counts as one message), keeps the most frequent messages
+per tool and renders them as bullet lines within a token budget. Tools take
+turns, so one noisy tool cannot crowd out the others.
+
+The rendered text is cached in feedback.db (`prompt_context_cache`) with the
+id of the newest failure it covers. It is rebuilt only when one of the tools
+has failed since, so a run without new failures costs one lookup per tool.
+"""
+import re
+
+from db.db import get_prompt_context, latest_failure_id, put_prompt_context, recent_failures
+from db.feedback_index import normalize
+
+DEFAULT_BUDGET_TOKENS = 300
+PER_TOOL = 3
+# rows read per tool when the summary is rebuilt
+RECENT_FAILURES = 500
+MESSAGE_CHARS = 160
+HEADER = "Failures seen in earlier runs (avoid repeating them):"
+
+_SPACE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    # roughly four characters per token for English text and identifiers
+    return (len(text) + 3) // 4
+
+
+def _compact(message: str) -> str:
+    message = _SPACE.sub(" ", message or "").strip()
+    return message if len(message) <= MESSAGE_CHARS else message[:MESSAGE_CHARS - 3] + "..."
+
+
+def summarize_failures(tool: str, limit: int = PER_TOOL) -> list[tuple[str, int, str]]:
+    """
+    The `limit` most frequent failure messages of `tool` as (newest example, count, last seen);
+    counts cover its last RECENT_FAILURES failures.
+    """
+    groups: dict[str, list] = {}
+    for comments, ts in recent_failures(tool, RECENT_FAILURES):
+        key = normalize(comments or "")
+        if key in groups:
+            groups[key][1] += 1
+        else:
+            groups[key] = [comments, 1, ts]
+    # rows come newest first and the sort is stable, so ties keep the most recent message first
+    ranked = sorted(groups.values(), key=lambda g: g[1], reverse=True)
+    return [(_compact(c), n, ts) for c, n, ts in ranked[:limit]]
+
+
+def build_failure_context(tools: list[str], budget_tokens: int = DEFAULT_BUDGET_TOKENS,
+                          per_tool: int = PER_TOOL) -> str:
+    """Render the failure summary of `tools` without the cache; empty if none of them has failed."""
+    summaries = {tool: summarize_failures(tool, per_tool) for tool in tools}
+    lines, used = [], estimate_tokens(HEADER)
+    for rank in range(per_tool):
+        for tool in tools:
+            if rank >= len(summaries[tool]):
+                continue
+            message, count, ts = summaries[tool][rank]
+            line = f"- {tool} ({count}x, last {str(ts)[:10]}): {message}"
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget_tokens:
+                continue
+            lines.append(line)
+            used += cost
+    return "\n".join([HEADER] + lines) if lines else ""
+
+
+def failure_context(tools: list[str], budget_tokens: int = DEFAULT_BUDGET_TOKENS, per_tool: int = PER_TOOL) -> str:
+    """Cached `build_failure_context`; rebuilt only when one of `tools` has a newer failure."""
+    tools = list(dict.fromkeys(tools))
+    cache_key = f"{','.join(tools)}|{budget_tokens}|{per_tool}"
+    latest = latest_failure_id(tools)
+    cached = get_prompt_context(cache_key)
+    if cached is not None and cached[0] == latest:
+        return cached[1]
+    text = build_failure_context(tools, budget_tokens, per_tool)
+    try:
+        put_prompt_context(cache_key, latest, text)
+    except Exception as e:
+        print(f"Warning: could not cache failure context: {e}")
+    return text
@@ -0,0 +1,236 @@
+"""feedback_index.py
+
+Similarity search over feedback comments.
+
+Comments are embedded on the CPU with signed feature hashing: each comment is
+normalised (lower case; URLs, paths, ids and long numbers replaced by
+placeholders, so the same failure on different files looks the same), split
+into words and word pairs, and every feature is hashed into one of DIM
+buckets. Vectors are L2-normalised, so a dot product is the cosine similarity.
+No model download is needed.
+
+Vectors live in the `feedback_vectors` table of feedback.db, keyed by feedback
+id, so several processes can add to the index safely. `sync` embeds the rows
+written since the last indexed id; once the index is open in a process it also
+runs whenever that process writes feedback. Queries keep one float32 matrix
+of distinct vectors per (tool, outcome) in memory, top it up with rows added
+since the previous query and score it with a single matrix-vector product.
+
+    from db.feedback_index import similar_feedback
+    similar_feedback("Upload failed: HTTP 403 for a_20250101.tsv", tool="upload_batch", k=5)
+"""
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from db.db import add_feedback_listener, connect
+from tracing.spans import traced
+
+DIM = 128
+SYNC_BATCH = 5000
+
+_URL = re.compile(r"\w+://\S+")
+_PATH = re.compile(r"(?:[a-z]:)?[\\/]?(?:[\w.-]+[\\/])+[\w.-]*")
+_FILE_NAME = re.compile(r"\b[\w-]+(?:\.[\w-]+)*\.[a-z][a-z0-9]{0,4}\b")
+_ID = re.compile(r"\b(?:[0-9a-f]{8}(?:-[0-9a-f]{4}){3}-[0-9a-f]{12}|[0-9a-f]{8,})\b")
+_LONG_NUMBER = re.compile(r"\d{4,}")
+_TOKEN = re.compile(r"[a-z]+|\d+")
+
+
+def normalize(text: str) -> str:
+    """Lower-case `text` and replace the parts that differ between otherwise identical messages."""
+    text = _URL.sub(" url ", text.lower())
+    text = _PATH.sub(" path ", text)
+    text = _FILE_NAME.sub(" file ", text)
+    text = _ID.sub(" id ", text)
+    return _LONG_NUMBER.sub(" num ", text)
+
+
+def _vector(normalized: str, dim: int) -> np.ndarray:
+    tokens = _TOKEN.findall(normalized)
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in set(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]):
+        h = zlib.crc32(feature.encode())
+        vector[h % dim] += 1.0 if h >> 31 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_many(texts: list[str], dim: int = DIM) -> np.ndarray:
+    """Hashed bag-of-words vectors for `texts`, one L2-normalised float32 row each."""
+    # feedback repeats a handful of message templates, so each normalised form is hashed once
+    vectors: dict[str, np.ndarray] = {}
+    matrix = np.empty((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        normalized = normalize(text or "")
+        vector = vectors.get(normalized)
+        if vector is None:
+            vector = vectors[normalized] = _vector(normalized, dim)
+        matrix[i] = vector
+    return matrix
+
+
+def embed(text: str, dim: int = DIM) -> np.ndarray:
+    return embed_many([text], dim)[0]
+
+
+class _Partition:
+    """
+    The distinct vectors of one (tool, is_accepted) group. Feedback repeats a few message
+    templates many times, so each distinct vector is kept once, with the id of its latest
+    feedback row and the number of rows that share it.
+    """
+
+    def __init__(self, dim: int):
+        self.matrix = np.empty((1024, dim), dtype=np.float32)
+        self.latest_ids: list[int] = []
+        self.counts: list[int] = []
+        self._rows: dict[int, int] = {}   # hash of the vector bytes -> row
+        self.last_id = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.latest_ids)
+
+    def add(self, rows: list[tuple[int, bytes]]) -> None:
+        new = []
+        for feedback_id, blob in rows:
+            key = hash(blob)
+            row = self._rows.get(key)
+            if row is None:
+                self._rows[key] = self.size
+                self.latest_ids.append(feedback_id)
+                self.counts.append(1)
+                new.append(blob)
+            else:
+                self.latest_ids[row] = feedback_id
+                self.counts[row] += 1
+        if new:
+            end = self.size
+            start = end - len(new)
+            if end > len(self.matrix):
+                matrix = np.empty((max(end, 2 * len(self.matrix)), self.matrix.shape[1]), dtype=np.float32)
+                matrix[:start] = self.matrix[:start]
+                self.matrix = matrix
+            self.matrix[start:end] = np.frombuffer(b"".join(new), dtype=np.float32).reshape(len(new), -1)
+        if rows:
+            self.last_id = rows[-1][0]
+
+
+class FeedbackIndex:
+    def __init__(self, dim: int = DIM):
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._partitions: dict[tuple[str, bool], _Partition] = {}
+        self._tools: set[str] = set()
+        self._tools_last_id = 0
+
+    @traced(kind="db")
+    def sync(self) -> int:
+        """Embed the feedback rows that are not indexed yet; returns how many were added."""
+        added = 0
+        with self._lock:
+            conn = connect()
+            last = conn.execute("SELECT COALESCE(MAX(feedback_id), 0) FROM feedback_vectors").fetchone()[0]
+            while True:
+                rows = conn.execute(
+                    "SELECT id, tool, is_accepted, comments FROM feedback WHERE id > ? ORDER BY id LIMIT ?",
+                    (last, SYNC_BATCH),
+                ).fetchall()
+                if not rows:
+                    break
+                vectors = embed_many([r[3] for r in rows], self.dim)
+                with conn:
+                    # another process may have indexed some of these rows already
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO feedback_vectors (feedback_id, tool, is_accepted, vector) VALUES (?, ?, ?, ?)",
+                        [(r[0], r[1], None if r[2] is None else bool(r[2]), v.tobytes()) for r, v in zip(rows, vectors)],
+                    )
+                added += len(rows)
+                last = rows[-1][0]
+        return added
+
+    def _partition(self, tool: str, accepted: bool) -> _Partition:
+        part = self._partitions.get((tool, accepted))
+        if part is None:
+            part = self._partitions[(tool, accepted)] = _Partition(self.dim)
+        part.add(connect().execute(
+            """
+            SELECT feedback_id, vector FROM feedback_vectors
+            WHERE tool = ? AND is_accepted = ? AND feedback_id > ? ORDER BY feedback_id
+            """,
+            (tool, accepted, part.last_id),
+        ).fetchall())
+        return part
+
+    def _tool_names(self) -> list[str]:
+        last = connect().execute("SELECT COALESCE(MAX(feedback_id), 0) FROM feedback_vectors").fetchone()[0]
+        # NOT INDEXED keeps this a rowid range scan of the new rows instead of a walk over the tool index
+        for (tool,) in connect().execute(
+            "SELECT DISTINCT tool FROM feedback_vectors NOT INDEXED WHERE feedback_id > ? AND feedback_id <= ?",
+            (self._tools_last_id, last),
+        ):
+            self._tools.add(tool)
+        self._tools_last_id = last
+        return sorted(self._tools)
+
+    @traced(kind="db")
+    def search(self, text: str, tool: str | None = None, k: int = 5, failures_only: bool = True) -> list[dict]:
+        """
+        The `k` distinct feedback messages most similar to `text`, best first. Each is a dict with
+        score, count (rows with the same normalised message) and the latest such row's feedback_id,
+        tool, is_accepted, comments and ts. Restricted to `tool` if given, and to rejected rows
+        unless `failures_only` is False.
+        """
+        query = embed(text, self.dim)
+        outcomes = (False,) if failures_only else (False, True)
+        candidates = []
+        with self._lock:
+            self.sync()
+            for t in ([tool] if tool is not None else self._tool_names()):
+                for accepted in outcomes:
+                    part = self._partition(t, accepted)
+                    if not part.size:
+                        continue
+                    scores = part.matrix[:part.size] @ query
+                    top = np.argpartition(-scores, k - 1)[:k] if part.size > k else range(part.size)
+                    candidates.extend((float(scores[i]), part.latest_ids[i], part.counts[i]) for i in top)
+        candidates = sorted(candidates, reverse=True)[:k]
+        if not candidates:
+            return []
+
+        placeholders = ",".join("?" * len(candidates))
+        rows = {
+            r[0]: r for r in connect().execute(
+                f"SELECT id, tool, is_accepted, comments, ts FROM feedback WHERE id IN ({placeholders})",
+                [feedback_id for _, feedback_id, _ in candidates],
+            )
+        }
+        return [
+            {"feedback_id": feedback_id, "score": round(score, 4), "count": count, "tool": rows[feedback_id][1],
+             "is_accepted": bool(rows[feedback_id][2]), "comments": rows[feedback_id][3], "ts": rows[feedback_id][4]}
+            for score, feedback_id, count in candidates
+            if feedback_id in rows
+        ]
+
+
+_index: FeedbackIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_feedback_index() -> FeedbackIndex:
+    """The process-wide index; from the first call on it is synced every time feedback is written."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = FeedbackIndex()
+                add_feedback_listener(_index.sync)
+    return _index
+
+
+def similar_feedback(text: str, tool: str | None = None, k: int = 5, failures_only: bool = True) -> list[dict]:
+    """Shortcut for `get_feedback_index().search(...)`."""
+    return get_feedback_index().search(text, tool=tool, k=k, failures_only=failures_only)
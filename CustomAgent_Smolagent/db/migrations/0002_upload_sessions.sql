@@ -0,0 +1,20 @@
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    object_key  TEXT    NOT NULL,
+    file_path   TEXT    NOT NULL,
+    file_size   INTEGER NOT NULL,
+    file_mtime  REAL    NOT NULL,
+    part_size   INTEGER NOT NULL,
+    upload_id   TEXT    NOT NULL,
+    completed   BOOLEAN DEFAULT 0,
+    ts          DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS upload_parts (
+    session_id  INTEGER NOT NULL,
+    part_number INTEGER NOT NULL,
+    etag        TEXT    NOT NULL,
+    size        INTEGER NOT NULL,
+    PRIMARY KEY (session_id, part_number),
+    FOREIGN KEY (session_id) REFERENCES upload_sessions(id)
+);
@@ -0,0 +1,11 @@
+-- get_file_id / insert_file look submissions up by name
+CREATE UNIQUE INDEX IF NOT EXISTS ux_submissions_name ON submissions (submission_name);
+
+-- get_file_id joins files on (submission_id, file_name)
+CREATE INDEX IF NOT EXISTS idx_files_submission_file ON files (submission_id, file_name);
+
+-- get_feedback_for_tool filters on tool, newest rows are read first
+CREATE INDEX IF NOT EXISTS idx_feedback_tool_ts ON feedback (tool, ts);
+
+-- resumable uploads look up unfinished sessions by object
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_object ON upload_sessions (object_key, completed);
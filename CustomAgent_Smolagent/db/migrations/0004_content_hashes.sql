@@ -0,0 +1,19 @@
+-- SHA-256 of every file the tools have read, with the stat it was computed for
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path        TEXT    PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    sha256      TEXT    NOT NULL,
+    ts          DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_file_hashes_sha256 ON file_hashes (sha256);
+
+-- content already stored at an upload target, so a repeated upload can be skipped
+CREATE TABLE IF NOT EXISTS uploaded_objects (
+    object_key  TEXT    NOT NULL,
+    sha256      TEXT    NOT NULL,
+    size        INTEGER NOT NULL,
+    ts          DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (object_key, sha256)
+);
@@ -0,0 +1,6 @@
+-- study IDs returned by getMyUser, per endpoint and submitter, most recent first
+CREATE TABLE IF NOT EXISTS study_cache (
+    cache_key   TEXT    PRIMARY KEY,
+    study_ids   TEXT    NOT NULL,   -- JSON array
+    fetched_at  REAL    NOT NULL    -- unix time
+);
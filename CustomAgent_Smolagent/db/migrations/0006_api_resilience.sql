@@ -0,0 +1,21 @@
+-- every GraphQL attempt, including retries and calls refused by the circuit breaker
+CREATE TABLE IF NOT EXISTS api_attempts (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    operation    TEXT    NOT NULL,
+    attempt      INTEGER NOT NULL,
+    outcome      TEXT    NOT NULL,   -- ok | retry | failed | circuit_open | recovered
+    status_code  INTEGER,
+    error        TEXT,
+    elapsed_ms   REAL,
+    ts           DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_api_attempts_operation_ts ON api_attempts (operation, ts);
+
+-- results of non-idempotent mutations, so a retried call returns the first result
+CREATE TABLE IF NOT EXISTS api_requests (
+    idempotency_key  TEXT    PRIMARY KEY,
+    operation        TEXT    NOT NULL,
+    response         TEXT    NOT NULL,   -- JSON
+    ts               DATETIME DEFAULT CURRENT_TIMESTAMP
+);
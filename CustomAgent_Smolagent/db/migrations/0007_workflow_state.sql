@@ -0,0 +1,22 @@
+-- checkpoint of a scripted submission run, keyed by the generated submission name
+CREATE TABLE IF NOT EXISTS workflow_state (
+    submission_name  TEXT    PRIMARY KEY,
+    config           TEXT    NOT NULL,   -- PipelineConfig JSON
+    result           TEXT    NOT NULL,   -- PipelineResult JSON, including completed_steps
+    status           TEXT    NOT NULL,   -- running | failed | completed
+    updated_at       DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- per-file batch, signed URL and upload status of a run
+CREATE TABLE IF NOT EXISTS workflow_files (
+    submission_name  TEXT    NOT NULL,
+    file_name        TEXT    NOT NULL,
+    full_path        TEXT    NOT NULL,
+    batch_id         TEXT,
+    signed_url       TEXT,
+    url_expires_at   REAL,               -- unix time, NULL if unknown
+    upload_status    TEXT    NOT NULL DEFAULT 'pending',   -- pending | uploaded | failed
+    error            TEXT,
+    updated_at       DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (submission_name, file_name)
+);
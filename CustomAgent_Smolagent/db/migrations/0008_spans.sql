@@ -0,0 +1,18 @@
+-- timing spans of tool calls, HTTP requests, db helpers, disk copies and model calls
+CREATE TABLE IF NOT EXISTS spans (
+    span_id      TEXT    PRIMARY KEY,
+    trace_id     TEXT    NOT NULL,
+    parent_id    TEXT,
+    name         TEXT    NOT NULL,
+    kind         TEXT    NOT NULL,   -- tool | http | db | disk | llm | step | pipeline | internal
+    start_ts     REAL    NOT NULL,   -- unix time
+    duration_ms  REAL    NOT NULL,
+    status       TEXT    NOT NULL,   -- ok | error
+    bytes        INTEGER,
+    error        TEXT,
+    attributes   TEXT                -- JSON
+);
+
+CREATE INDEX IF NOT EXISTS idx_spans_trace ON spans (trace_id);
+CREATE INDEX IF NOT EXISTS idx_spans_name_start ON spans (name, start_ts);
+CREATE INDEX IF NOT EXISTS idx_spans_start ON spans (start_ts);
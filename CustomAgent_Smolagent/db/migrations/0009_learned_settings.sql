@@ -0,0 +1,35 @@
+-- parameters tools learn from their feedback, one row per (tool, key), read with get_learned_setting
+CREATE TABLE IF NOT EXISTS learned_settings (
+    tool         TEXT    NOT NULL,
+    key          TEXT    NOT NULL,
+    value        TEXT,
+    feedback_id  INTEGER,             -- feedback row the value was learned from, NULL if set directly
+    updated_at   DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (tool, key)
+);
+
+-- PrepareMetadata: the base dir of the last accepted "Saved to: <base>/CustomAgent_Smolagent/submissions/..." path
+CREATE TRIGGER IF NOT EXISTS learn_prepare_metadata_base_dir
+AFTER INSERT ON feedback
+WHEN NEW.tool = 'PrepareMetadata' AND NEW.is_accepted AND instr(NEW.comments, 'Saved to:') > 0
+BEGIN
+    INSERT OR REPLACE INTO learned_settings (tool, key, value, feedback_id, updated_at)
+    SELECT 'PrepareMetadata', 'base_dir',
+           rtrim(substr(path, 1, instr(path, 'CustomAgent_Smolagent/submissions') - 1), '/\'),
+           NEW.id, CURRENT_TIMESTAMP
+    FROM (SELECT trim(substr(NEW.comments, instr(NEW.comments, 'Saved to:') + 9)) AS path)
+    WHERE instr(path, 'CustomAgent_Smolagent/submissions') > 0;
+END;
+
+-- learn from the feedback already recorded
+INSERT OR REPLACE INTO learned_settings (tool, key, value, feedback_id)
+SELECT 'PrepareMetadata', 'base_dir',
+       rtrim(substr(path, 1, instr(path, 'CustomAgent_Smolagent/submissions') - 1), '/\'), id
+FROM (
+    SELECT id, trim(substr(comments, instr(comments, 'Saved to:') + 9)) AS path
+    FROM feedback
+    WHERE tool = 'PrepareMetadata' AND is_accepted AND instr(comments, 'Saved to:') > 0
+)
+WHERE instr(path, 'CustomAgent_Smolagent/submissions') > 0
+ORDER BY id DESC
+LIMIT 1;
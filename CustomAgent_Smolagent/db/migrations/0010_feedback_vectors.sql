@@ -0,0 +1,10 @@
+-- hashed-feature embeddings of feedback.comments, filled incrementally by db/feedback_index.py
+CREATE TABLE IF NOT EXISTS feedback_vectors (
+    feedback_id  INTEGER PRIMARY KEY,   -- feedback.id
+    tool         TEXT    NOT NULL,
+    is_accepted  BOOLEAN,
+    vector       BLOB    NOT NULL       -- float32[dim], L2-normalised
+);
+
+-- the index loads one (tool, outcome) partition at a time and tops it up by id
+CREATE INDEX IF NOT EXISTS idx_feedback_vectors_partition ON feedback_vectors (tool, is_accepted, feedback_id);
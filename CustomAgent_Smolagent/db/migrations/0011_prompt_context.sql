@@ -0,0 +1,10 @@
+-- newest rejected feedback per tool, for failure summaries in agent prompts
+CREATE INDEX IF NOT EXISTS idx_feedback_tool_failures ON feedback (tool, id) WHERE is_accepted = 0;
+
+-- rendered failure summaries, valid while no newer failure exists for their tools
+CREATE TABLE IF NOT EXISTS prompt_context_cache (
+    cache_key    TEXT    PRIMARY KEY,   -- tools, token budget and messages per tool
+    feedback_id  INTEGER NOT NULL,      -- newest failure the text covers, 0 if none
+    text         TEXT    NOT NULL,
+    built_at     DATETIME DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,2 @@
+-- uploads are no longer skipped by content: Datahub issues new object keys for every batch
+DROP TABLE IF EXISTS uploaded_objects;
@@ -0,0 +1,172 @@
+"""writer.py
+
+Background feedback writer.
+
+Tools queue feedback rows with `queue_feedback` and return immediately; a
+daemon thread drains the queue and inserts rows with one `executemany` per
+transaction whenever `max_batch` rows are waiting or `flush_interval` seconds
+have passed. Rows may name the file by (submission_name, file_name) instead of
+file_id, in which case the id is resolved inside the INSERT rather than with a
+`get_file_id` round trip per file. Other append-only tables (e.g. `api_attempts`)
+go through the same queue with `queue_row`. Pending rows are flushed at
+interpreter exit. A forked child, or a process whose writer was closed, gets a
+new writer on its next `queue_feedback` instead of a dead one.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+from db.db import connect, cached_file_id, feedback_written
+
+INSERT_FEEDBACK = """
+    INSERT INTO feedback (file_id, source, tool, is_accepted, comments)
+    VALUES (
+        COALESCE(?, (
+            SELECT files.id
+            FROM files
+            JOIN submissions ON files.submission_id = submissions.id
+            WHERE submissions.submission_name = ? AND files.file_name = ?
+        ), -1),
+        ?, ?, ?, ?
+    )
+"""
+
+
+class FeedbackWriter:
+    def __init__(self, max_batch: int = 500, flush_interval: float = 0.5):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def alive(self) -> bool:
+        """False once closed, in a forked child (the thread isn't copied), or if the thread died."""
+        return not self._closed and self._pid == os.getpid() and self._thread.is_alive()
+
+    def submit(self, source: str, tool: str, is_accepted: bool, comments: str, file_id: int | None = None,
+               submission_name: str | None = None, file_name: str | None = None) -> None:
+        if self._closed:
+            raise RuntimeError("FeedbackWriter is closed")
+        self.submit_row(INSERT_FEEDBACK, (file_id, submission_name, file_name, source, tool, is_accepted, comments))
+
+    def submit_row(self, sql: str, params: tuple) -> None:
+        if self._closed:
+            raise RuntimeError("FeedbackWriter is closed")
+        self._queue.put((sql, params))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Block until every row queued so far is committed. Returns False on timeout.
+        Raises instead of blocking if the writer thread is not running.
+        """
+        if not self.alive:
+            raise RuntimeError("FeedbackWriter is closed or its thread is not running")
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float | None = 10.0) -> None:
+        if self._closed:
+            return
+        if self.alive:
+            self.flush(timeout)
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            rows, waiters, stop = [], [], False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    rows.append(item)
+                # a flush request or a full batch writes now; otherwise keep collecting
+                if stop or waiters or len(rows) >= self.max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if rows:
+                self._write(rows)
+            for w in waiters:
+                w.set()
+            if stop:
+                return
+
+    def _write(self, rows: list[tuple]) -> None:
+        by_sql: dict[str, list[tuple]] = {}
+        for sql, params in rows:
+            by_sql.setdefault(sql, []).append(params)
+        try:
+            self._write_groups(by_sql)
+        except Exception:
+            # write each table on its own, so e.g. a missing optional table doesn't drop feedback rows
+            for sql, params in by_sql.items():
+                try:
+                    self._write_groups({sql: params})
+                except Exception as e:
+                    print(f"Failed to write {len(params)} rows ({sql.split('(')[0].strip()}): {e}")
+
+    @staticmethod
+    def _write_groups(by_sql: dict[str, list[tuple]]) -> None:
+        with connect() as conn:
+            for sql, params in by_sql.items():
+                conn.executemany(sql, params)
+        if INSERT_FEEDBACK in by_sql:
+            # refreshes learned settings and the feedback index
+            feedback_written()
+
+
+_writer: FeedbackWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> FeedbackWriter:
+    global _writer
+    if _writer is None or not _writer.alive:
+        with _writer_lock:
+            if _writer is None or not _writer.alive:
+                _writer = FeedbackWriter()
+                atexit.register(_writer.close)
+    return _writer
+
+
+def queue_feedback(source: str, tool: str, is_accepted: bool, comments: str, file_id: int | None = None,
+                   submission_name: str | None = None, file_name: str | None = None) -> None:
+    """
+    Queue a feedback row for the background writer.
+    Pass `file_id`, or `submission_name` and `file_name` to have the id looked up at write time
+    (-1 if the file is unknown).
+    """
+    if file_id is None and submission_name is not None:
+        file_id = cached_file_id(submission_name, file_name)
+    get_writer().submit(source, tool, is_accepted, comments, file_id, submission_name, file_name)
+
+
+def queue_row(sql: str, params: tuple) -> None:
+    """Queue an arbitrary INSERT for the background writer."""
+    get_writer().submit_row(sql, params)
+
+
+def flush_feedback(timeout: float | None = None) -> bool:
+    """Wait until all queued feedback is written."""
+    # a closed writer flushed on close; a forked child's copy holds the parent's rows, not ours
+    if _writer is None or not _writer.alive:
+        return True
+    return _writer.flush(timeout)
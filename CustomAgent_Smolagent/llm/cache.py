@@ -0,0 +1,240 @@
+"""cache.py
+
+Record/replay cache for smolagents model calls.
+
+`cache_model(model)` wraps a model's `generate` (and `generate_stream`) so that
+each response is stored under a SHA-256 of the model id, the messages, the
+stop sequences, the schemas of the tools offered to the model and any other
+generation arguments. It is also stored under a second key computed with the
+volatile values in the messages (UUIDs, timestamps and timestamped names,
+presigned URL signatures, durations and rates) replaced by placeholders. Only
+replay mode falls back to that key, so a replayed session whose ids and times
+differ from the recorded one still finds its responses, while record mode only
+reuses a response for exactly the same request.
+
+Caching is per model call only. Tool calls are not recorded: in replay mode
+the agent's tools still run for real (and reach Datahub), and a replayed
+response still contains the ids and names of the run that recorded it. Responses live in a small SQLite file with LRU eviction, separate
+from feedback.db so it can be copied around as a replay fixture.
+
+Modes (CRDC_LLM_CACHE):
+
+    off      pass every call through (default)
+    record   answer identical requests from the cache, otherwise call the model and store the response
+    replay   answer only from the cache, exact or normalized; a miss raises ReplayMissError,
+             so no model request reaches Bedrock
+    refresh  always call the model and overwrite the stored response
+
+CRDC_LLM_CACHE_PATH sets the cache file (default db/llm_cache.db) and
+CRDC_LLM_CACHE_MAX_MB its size limit (default 200); the least recently used
+responses are evicted beyond it.
+"""
+from pathlib import Path
+import functools
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from smolagents.models import ChatMessage, ChatMessageStreamDelta, ChatMessageToolCallStreamDelta, TokenUsage
+
+from tracing.spans import current_span
+
+MODES = ("off", "record", "replay", "refresh")
+DEFAULT_PATH = Path(__file__).resolve().parent.parent / "db" / "llm_cache.db"
+DEFAULT_MAX_MB = 200.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    cache_key      TEXT    PRIMARY KEY,
+    model_id       TEXT,
+    response       TEXT    NOT NULL,   -- ChatMessage JSON without the raw API response
+    input_tokens   INTEGER,
+    output_tokens  INTEGER,
+    size           INTEGER NOT NULL,
+    created_at     REAL    NOT NULL,
+    last_used      REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used);
+"""
+
+
+# (pattern, placeholder) applied to message text for the replay key; order matters (timestamps before stamps)
+VOLATILE = [
+    (re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.I), "<uuid>"),
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<time>"),
+    (re.compile(r"\d{6,8}_\d{6}"), "<stamp>"),
+    (re.compile(r"\?X-Amz-[^\s\"'\]\)]*"), "?<signature>"),
+    (re.compile(r"\d+(?:\.\d+)?(?=\s*(?:s|ms|[KMG]?B/s)\b)"), "<n>"),
+]
+
+
+class ReplayMissError(RuntimeError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def _plain(value):
+    """Messages and other dataclasses as plain JSON-able data."""
+    if isinstance(value, ChatMessage):
+        value = value.dict()
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items() if k not in ("raw", "token_usage")}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def normalize(value):
+    """Strings inside `value` with the VOLATILE patterns replaced by placeholders."""
+    if isinstance(value, str):
+        for pattern, placeholder in VOLATILE:
+            value = pattern.sub(placeholder, value)
+        return value
+    if isinstance(value, dict):
+        return {k: normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [normalize(v) for v in value]
+    return value
+
+
+def request_key(model_id: str | None, messages: list, stop_sequences: list[str] | None = None,
+                response_format: dict | None = None, tools_to_call_from: list | None = None,
+                *, normalized: bool = False, **kwargs) -> str:
+    """
+    SHA-256 over everything that determines the model's answer. With `normalized`,
+    volatile values in the messages are replaced by placeholders first.
+    """
+    tools = [
+        {"name": t.name, "description": t.description, "inputs": t.inputs, "output_type": t.output_type}
+        for t in tools_to_call_from or []
+    ]
+    payload = {
+        "model_id": model_id,
+        "messages": normalize(_plain(messages)) if normalized else _plain(messages),
+        "stop_sequences": stop_sequences,
+        "response_format": response_format,
+        "tools": tools,
+        "kwargs": _plain(kwargs),
+    }
+    blob = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str | Path | None = None, max_mb: float | None = None):
+        self.path = Path(path or os.getenv("CRDC_LLM_CACHE_PATH") or DEFAULT_PATH)
+        if max_mb is None:
+            max_mb = float(os.getenv("CRDC_LLM_CACHE_MAX_MB", DEFAULT_MAX_MB))
+        self.max_bytes = int(max_mb * 1024 ** 2)
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def get(self, key: str) -> ChatMessage | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, input_tokens, output_tokens FROM responses WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE cache_key = ?", (time.time(), key))
+        usage = TokenUsage(input_tokens=row[1], output_tokens=row[2]) if row[1] is not None else None
+        return ChatMessage.from_dict(json.loads(row[0]), token_usage=usage)
+
+    def put(self, key: str, model_id: str | None, message: ChatMessage) -> None:
+        response = json.dumps(_plain(message), default=str)
+        usage = message.token_usage
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO responses
+                    (cache_key, model_id, response, input_tokens, output_tokens, size, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, model_id, response, usage.input_tokens if usage else None,
+                 usage.output_tokens if usage else None, len(response), now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in self._conn.execute("SELECT cache_key, size FROM responses ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE cache_key = ?", stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+def cache_model(model, mode: str | None = None, cache: ResponseCache | None = None):
+    """
+    Serve `model.generate` / `model.generate_stream` from a ResponseCache (see the module
+    docstring for the modes). Returns the model; `model.response_cache` is the cache used.
+    """
+    mode = (mode or os.getenv("CRDC_LLM_CACHE", "off")).lower()
+    if mode not in MODES:
+        raise ValueError(f"CRDC_LLM_CACHE must be one of {', '.join(MODES)}, got {mode!r}")
+    if mode == "off":
+        return model
+    cache = cache or ResponseCache()
+    model_id = getattr(model, "model_id", None)
+    generate = model.generate
+
+    @functools.wraps(generate)
+    def cached_generate(messages, *args, **kwargs):
+        key = request_key(model_id, messages, *args, **kwargs)
+        replay_key = request_key(model_id, messages, *args, normalized=True, **kwargs)
+        s = current_span()
+        if mode != "refresh":
+            message = cache.get(key)
+            if message is None and mode == "replay" and replay_key != key:
+                message = cache.get(replay_key)
+            if message is not None:
+                if s is not None:
+                    s.set(cache="hit")
+                return message
+            if mode == "replay":
+                raise ReplayMissError(f"No recorded response for request {key[:16]} (model {model_id}) in {cache.path}")
+        if s is not None:
+            s.set(cache="miss")
+        message = generate(messages, *args, **kwargs)
+        try:
+            cache.put(key, model_id, message)
+            if replay_key != key:
+                cache.put(replay_key, model_id, message)
+        except Exception as e:
+            print(f"Warning: could not cache model response: {e}")
+        return message
+
+    model.generate = cached_generate
+    if hasattr(model, "generate_stream"):
+        # a cached answer has no stream, so streaming callers get the whole message as one delta
+        def cached_stream(messages, *args, **kwargs):
+            message = cached_generate(messages, *args, **kwargs)
+            tool_calls = [
+                ChatMessageToolCallStreamDelta(index=i, id=call.id, type=call.type, function=call.function)
+                for i, call in enumerate(message.tool_calls or [])
+            ]
+            yield ChatMessageStreamDelta(content=message.content, tool_calls=tool_calls or None,
+                                         token_usage=message.token_usage)
+        model.generate_stream = cached_stream
+    model.response_cache = cache
+    return model
@@ -0,0 +1,426 @@
+"""mock_server.py
+
+Local stand-in for the CRDC Datahub GraphQL API and its presigned S3 uploads,
+for offline testing and benchmarking.
+
+Implements `getMyUser`, `createSubmission`, `listSubmissions`, `createBatch`
+and `updateBatch` at `/api/graphql`, and accepts uploads at the signed URLs it
+hands out (single PUT, or the S3 multipart protocol used by `api/multipart.py`).
+Uploaded bytes are discarded unless `--store-dir` is given. Signed URLs carry
+SigV4-style `X-Amz-Date` / `X-Amz-Expires` parameters and an HMAC signature,
+and are rejected with 403 once they expire.
+
+Latency, error injection and upload bandwidth are configurable:
+
+    python mock_server.py --port 8765 --latency 0.05 --error-rate 0.02 --bandwidth 50
+    export CRDC_API_URL=http://127.0.0.1:8765/api/graphql
+
+or in-process:
+
+    with MockServer(latency=0.01) as server:
+        configure_client(api_url=server.url, token="mock")
+"""
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+GRAPHQL_PATH = "/api/graphql"
+OPERATIONS = ("getMyUser", "createSubmission", "listSubmissions", "createBatch", "updateBatch")
+READ_BLOCK = 256 * 1024
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class MockServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, throttle_rate: float = 0.0,
+                 put_error_rate: float = 0.0, bandwidth: float = 0.0, url_ttl: int = 3600,
+                 studies: int = 3, token: str | None = None, store_dir: str | None = None, seed: int | None = None):
+        """
+        latency/jitter    seconds added to every GraphQL response (uniform in latency +- jitter)
+        error_rate        fraction of GraphQL calls answered with `error_status`
+        throttle_rate     fraction of GraphQL calls answered with 429 and Retry-After: 1
+        put_error_rate    fraction of uploads answered with 503
+        bandwidth         upload limit per connection in MB/s (0 = unlimited)
+        url_ttl           lifetime of signed URLs in seconds
+        token             if set, GraphQL calls must send `Authorization: Bearer <token>`
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.throttle_rate = throttle_rate
+        self.put_error_rate = put_error_rate
+        self.bandwidth = bandwidth * 1024 * 1024
+        self.url_ttl = url_ttl
+        self.token = token
+        self.store_dir = store_dir
+        self.secret = os.urandom(16)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.studies = [{"_id": f"study-{i}", "studyName": f"Mock study {i}", "studyAbbreviation": f"MS{i}",
+                         "createdAt": f"2024-{i % 12 + 1:02d}-01T00:00:00.000Z"} for i in range(1, studies + 1)]
+        self.submissions: dict[str, dict] = {}
+        self.batches: dict[str, dict] = {}
+        self.multipart: dict[str, dict[int, int]] = {}
+        self.objects: dict[str, int] = {}
+        self.stats = {op: 0 for op in OPERATIONS}
+        self.stats.update(errors=0, put_requests=0, put_bytes=0, rejected_urls=0)
+
+        self._httpd = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def url(self) -> str:
+        """GraphQL endpoint, for CRDC_API_URL or configure_client(api_url=...)."""
+        return self.base_url + GRAPHQL_PATH
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-datahub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    def chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    # ----- signed URLs -----
+
+    def _signature(self, path: str, date: str, expires: str) -> str:
+        return hmac.new(self.secret, f"{path}|{date}|{expires}".encode(), hashlib.sha256).hexdigest()
+
+    def sign(self, path: str) -> str:
+        date = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        expires = str(self.url_ttl)
+        return (f"{self.base_url}{path}?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Date={date}"
+                f"&X-Amz-Expires={expires}&X-Amz-Signature={self._signature(path, date, expires)}")
+
+    def check_signature(self, path: str, query: dict[str, str]) -> str | None:
+        """None if the signed URL is valid, otherwise the reason it is not."""
+        date, expires, signature = query.get("X-Amz-Date"), query.get("X-Amz-Expires"), query.get("X-Amz-Signature")
+        if not (date and expires and signature):
+            return "Missing signature"
+        if not hmac.compare_digest(signature, self._signature(path, date, expires)):
+            return "SignatureDoesNotMatch"
+        signed = datetime.strptime(date, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc).timestamp()
+        if time.time() > signed + int(expires):
+            return "Request has expired"
+        return None
+
+    # ----- GraphQL operations -----
+
+    def getMyUser(self, variables: dict) -> dict:
+        return {"_id": "mock-user", "firstName": "Mock", "lastName": "Submitter", "studies": self.studies}
+
+    def createSubmission(self, variables: dict) -> dict:
+        for key in ("studyID", "dataCommons", "name", "intention", "dataType"):
+            if not variables.get(key):
+                raise ValueError(f"Variable '{key}' is required")
+        if variables["studyID"] not in {s["_id"] for s in self.studies}:
+            raise ValueError(f"Study {variables['studyID']} is not assigned to the user")
+        submission = {"_id": str(uuid.uuid4()), "name": variables["name"], "studyID": variables["studyID"],
+                      "dataCommons": variables["dataCommons"], "intention": variables["intention"],
+                      "dataType": variables["dataType"], "status": "New", "createdAt": _now()}
+        with self._lock:
+            self.submissions[submission["_id"]] = submission
+        return submission
+
+    def listSubmissions(self, variables: dict) -> dict:
+        with self._lock:
+            items = sorted(self.submissions.values(), key=lambda s: s["createdAt"], reverse=True)
+        offset = variables.get("offset") or 0
+        first = variables.get("first") or 10
+        return {"total": len(items), "submissions": items[offset:offset + first] if first > 0 else items[offset:]}
+
+    def createBatch(self, variables: dict) -> dict:
+        submission_id = variables.get("submissionID")
+        if submission_id not in self.submissions:
+            raise ValueError(f"Submission {submission_id} not found")
+        files = variables.get("files") or []
+        if not files:
+            raise ValueError("A batch needs at least one file")
+        batch_id = str(uuid.uuid4())
+        prefix = f"{submission_id}/metadata/{batch_id}"
+        batch = {
+            "_id": batch_id, "submissionID": submission_id, "bucketName": "mock-bucket", "filePrefix": prefix,
+            "type": variables.get("type") or "metadata", "fileCount": len(files),
+            "files": [{"fileName": f, "signedURL": self.sign(f"/upload/{prefix}/{quote(f)}")} for f in files],
+            "status": "New", "createdAt": _now(), "updatedAt": _now(),
+        }
+        with self._lock:
+            self.batches[batch_id] = batch
+        return batch
+
+    def updateBatch(self, variables: dict) -> dict:
+        batch = self.batches.get(variables.get("batchID"))
+        if batch is None:
+            raise ValueError(f"Batch {variables.get('batchID')} not found")
+        known = {f["fileName"] for f in batch["files"]}
+        files = []
+        for result in variables.get("files") or []:
+            if result["fileName"] not in known:
+                raise ValueError(f"File {result['fileName']} is not part of batch {batch['_id']}")
+            key = f"{batch['filePrefix']}/{result['fileName']}"
+            uploaded = bool(result.get("succeeded")) and key in self.objects
+            errors = result.get("errors") or ([] if uploaded else ["File was not received"])
+            files.append({"filePrefix": batch["filePrefix"], "fileName": result["fileName"],
+                          "size": self.objects.get(key, 0), "status": "Uploaded" if uploaded else "Failed",
+                          "errors": errors, "createdAt": batch["createdAt"], "updatedAt": _now()})
+        with self._lock:
+            batch.update(files=files, status="Uploaded" if all(f["status"] == "Uploaded" for f in files) else "Failed",
+                         updatedAt=_now())
+            return dict(batch)
+
+
+def _handler_for(server: MockServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body go out in separate writes; with Nagle on, keep-alive clients wait for the delayed ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send(self, status: int, body: bytes = b"", content_type: str = "application/json",
+                  headers: dict | None = None) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json(self, status: int, obj, headers: dict | None = None) -> None:
+            self._send(status, json.dumps(obj).encode(), headers=headers)
+
+        def _read_body(self, sink=None) -> int:
+            """Read the request body (Content-Length or chunked) at the configured bandwidth."""
+            total = 0
+            start = time.perf_counter()
+
+            def consume(block: bytes) -> None:
+                nonlocal total
+                total += len(block)
+                if sink is not None:
+                    sink.write(block)
+                if server.bandwidth > 0:
+                    ahead = total / server.bandwidth - (time.perf_counter() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+            if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                while True:
+                    size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                    if size == 0:
+                        self.rfile.readline()
+                        break
+                    remaining = size
+                    while remaining:
+                        block = self.rfile.read(min(READ_BLOCK, remaining))
+                        remaining -= len(block)
+                        consume(block)
+                    self.rfile.readline()
+            else:
+                remaining = int(self.headers.get("Content-Length") or 0)
+                while remaining:
+                    block = self.rfile.read(min(READ_BLOCK, remaining))
+                    if not block:
+                        break
+                    remaining -= len(block)
+                    consume(block)
+            return total
+
+        def _split(self) -> tuple[str, dict[str, str]]:
+            parts = urlsplit(self.path)
+            query = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+            return parts.path, query
+
+        # ----- GraphQL -----
+
+        def do_POST(self) -> None:
+            path, query = self._split()
+            if path.startswith("/upload/"):
+                return self._multipart_post(path, query)
+            if path != GRAPHQL_PATH:
+                return self._json(404, {"message": "Not found"})
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+            except ValueError:
+                return self._json(400, {"errors": [{"message": "Body is not JSON"}]})
+
+            if server.latency or server.jitter:
+                time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+            if server.token and self.headers.get("Authorization") != f"Bearer {server.token}":
+                return self._json(401, {"errors": [{"message": "Unauthorized"}]})
+            if server.chance(server.throttle_rate):
+                server.count("errors")
+                return self._json(429, {"errors": [{"message": "Too many requests"}]}, {"Retry-After": "1"})
+            if server.chance(server.error_rate):
+                server.count("errors")
+                return self._json(server.error_status, {"errors": [{"message": "Injected error"}]})
+
+            # the first root field of the document names the operation
+            match = re.search(r"\{\s*(\w+)", payload.get("query") or "")
+            operation = match.group(1) if match else None
+            if operation not in OPERATIONS:
+                return self._json(200, {"errors": [{"message": f"Unknown operation {operation}"}]})
+            server.count(operation)
+            try:
+                data = getattr(server, operation)(payload.get("variables") or {})
+            except (ValueError, KeyError, TypeError) as e:
+                return self._json(200, {"data": None, "errors": [{"message": str(e), "path": [operation]}]})
+            self._json(200, {"data": {operation: data}})
+
+        def do_GET(self) -> None:
+            path, _ = self._split()
+            if path == "/stats":
+                with server._lock:
+                    return self._json(200, dict(server.stats))
+            self._json(404, {"message": "Not found"})
+
+        # ----- uploads -----
+
+        def do_PUT(self) -> None:
+            path, query = self._split()
+            if not path.startswith("/upload/"):
+                return self._json(404, {"message": "Not found"})
+            server.count("put_requests")
+            if "uploadId" in query:
+                return self._upload_part(path, query)
+            reason = server.check_signature(path, query)
+            if reason:
+                self._read_body()
+                server.count("rejected_urls")
+                return self._send(403, f"<Error><Code>AccessDenied</Code><Message>{reason}</Message></Error>".encode(),
+                                  "application/xml")
+            if server.chance(server.put_error_rate):
+                self._read_body()
+                server.count("errors")
+                return self._send(503, b"<Error><Code>SlowDown</Code></Error>", "application/xml")
+            key = unquote(path[len("/upload/"):])
+            sink = None
+            if server.store_dir:
+                dest = os.path.join(server.store_dir, key)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                sink = open(dest, "wb")
+            try:
+                size = self._read_body(sink)
+            finally:
+                if sink is not None:
+                    sink.close()
+            server.count("put_bytes", size)
+            with server._lock:
+                server.objects[key] = size
+            self._send(200, headers={"ETag": f'"{uuid.uuid4().hex}"'})
+
+        def _upload_part(self, path: str, query: dict[str, str]) -> None:
+            upload_id = query["uploadId"]
+            parts = server.multipart.get(upload_id)
+            if parts is None:
+                self._read_body()
+                return self._send(404, b"<Error><Code>NoSuchUpload</Code></Error>", "application/xml")
+            if server.chance(server.put_error_rate):
+                self._read_body()
+                server.count("errors")
+                return self._send(503, b"<Error><Code>SlowDown</Code></Error>", "application/xml")
+            size = self._read_body()
+            server.count("put_bytes", size)
+            with server._lock:
+                parts[int(query["partNumber"])] = size
+            self._send(200, headers={"ETag": f'"{hashlib.md5(f"{upload_id}{size}".encode()).hexdigest()}"'})
+
+        def _multipart_post(self, path: str, query: dict[str, str]) -> None:
+            self._read_body()
+            key = unquote(path[len("/upload/"):])
+            if "uploads" in query:
+                upload_id = uuid.uuid4().hex
+                with server._lock:
+                    server.multipart[upload_id] = {}
+                return self._send(200, (f"<InitiateMultipartUploadResult><Key>{key}</Key>"
+                                        f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>").encode(),
+                                  "application/xml")
+            if "uploadId" in query:
+                with server._lock:
+                    parts = server.multipart.pop(query["uploadId"], None)
+                    if parts is not None:
+                        server.objects[key] = sum(parts.values())
+                if parts is None:
+                    return self._send(404, b"<Error><Code>NoSuchUpload</Code></Error>", "application/xml")
+                return self._send(200, f"<CompleteMultipartUploadResult><Key>{key}</Key></CompleteMultipartUploadResult>"
+                                  .encode(), "application/xml")
+            self._json(400, {"message": "Unsupported request"})
+
+    return Handler
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run a local mock of the CRDC Datahub API and upload endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every GraphQL response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of GraphQL calls that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status for injected errors")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of GraphQL calls answered with 429")
+    parser.add_argument("--put-error-rate", type=float, default=0.0, help="fraction of uploads that fail with 503")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="upload limit per connection in MB/s")
+    parser.add_argument("--url-ttl", type=int, default=3600, help="signed URL lifetime in seconds")
+    parser.add_argument("--studies", type=int, default=3, help="studies returned by getMyUser")
+    parser.add_argument("--token", help="require this bearer token")
+    parser.add_argument("--store-dir", help="keep uploaded files here instead of discarding them")
+    parser.add_argument("--seed", type=int, help="seed for error injection")
+    args = parser.parse_args(argv)
+
+    server = MockServer(host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, error_status=args.error_status,
+                        throttle_rate=args.throttle_rate, put_error_rate=args.put_error_rate,
+                        bandwidth=args.bandwidth, url_ttl=args.url_ttl, studies=args.studies,
+                        token=args.token, store_dir=args.store_dir, seed=args.seed)
+    print(f"Mock Datahub listening; export CRDC_API_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+"""pipeline.py
+
+Deterministic submission workflow.
+
+Chains the existing tools directly, in the same order the CodeAgent prompt
+describes (name -> prepare -> validate -> studies -> submission -> batch ->
+upload -> update), passing typed results between steps instead of asking the model to
+plan each run. The Bedrock agent is only used as a fallback when a step fails.
+
+Every completed step is checkpointed in feedback.db (`workflow_state`, plus
+per-file batch, signed URL and upload status in `workflow_files`) under the
+generated submission name. `--resume NAME` continues such a run: completed
+steps are skipped, files already uploaded are not sent again, and only
+signed URLs that have expired are re-requested with a new createBatch.
+Batches whose files all moved to a newer batch are still closed with
+updateBatch (their moved files reported as failed), and each batch is updated
+only once, even across resumes.
+
+    python pipeline.py --folder /path/to/metadata --base-dir /path/to/CustomAgent_Smolagent
+    python pipeline.py --resume sub_250101_120000
+"""
+from pydantic import BaseModel, Field
+import argparse
+import json
+import time
+
+from db.db import (
+    init_schema,
+    save_workflow_state,
+    load_workflow_state,
+    save_workflow_files,
+    get_workflow_files,
+)
+from tracing.spans import span, trace_model
+import tools
+
+STEPS = [
+    "generate_submission_name",
+    "prepare_metadata",
+    "validate_metadata",
+    "get_my_studies",
+    "create_submission",
+    "create_batch",
+    "upload",
+    "update_batch",
+]
+
+# the `tool` each step's feedback is recorded under
+STEP_FEEDBACK_TOOLS = {
+    "generate_submission_name": "GenerateSubmissionName",
+    "prepare_metadata": "PrepareMetadata",
+    "validate_metadata": "ValidateMetadata",
+    "get_my_studies": "GetMyStudies",
+    "create_submission": "CreateSubmission",
+    "create_batch": "CreateBatch",
+    "upload": "upload_batch",
+    "update_batch": "update_batch",
+}
+
+# a signed URL that expires within this many seconds is treated as expired
+URL_EXPIRY_MARGIN = 60
+
+
+class PipelineConfig(BaseModel):
+    folder_path: str = Field(..., description="Folder with the metadata files to submit.")
+    base_dir: str = Field(..., description="Directory where the 'submissions' folder resides or will be created.")
+    data_commons: str = Field("CDS", description="Data commons to submit to.")
+    intention: str = Field("New/Update", description="Submission intention ('New/Update' or 'Delete').")
+    data_type: str = Field("Metadata Only", description="'Metadata Only' or 'Metadata and Data Files'.")
+    batch_type: str = Field("metadata", description="Batch type passed to createBatch.")
+    study_id: str | None = Field(None, description="Study to submit to; defaults to the most recent study.")
+    staging_mode: str = Field("auto", description="How prepare_metadata places files (see staging/stage.py).")
+    validate_files: bool = Field(True, description="Check the TSVs locally and drop invalid files before createBatch.")
+    upload_workers: int = Field(4, description="Concurrent file uploads.")
+    llm_fallback: bool = Field(True, description="Hand the remaining steps to the CodeAgent when a step fails; "
+                                                 "otherwise return the result with failed_step set.")
+
+
+class PreparedFile(BaseModel):
+    fileName: str
+    fullPath: str
+
+
+class PipelineResult(BaseModel):
+    submission_name: str | None = None
+    files: list[PreparedFile] = []
+    rejected_files: list[dict] = []
+    study_id: str | None = None
+    submission_id: str | None = None
+    batch_id: str | None = None
+    batch_ids: list[str] = []
+    # batch id -> {file name: id of the batch its URL was re-requested in}
+    superseded_files: dict[str, dict[str, str]] = {}
+    updated_batches: list[str] = []
+    batch: dict | None = None
+    upload: dict | None = None
+    batch_status: str | None = None
+    completed_steps: list[str] = []
+    resumed: bool = False
+    refreshed_urls: int = 0
+    timings: dict[str, float] = {}
+    failed_step: str | None = None
+    error: str | None = None
+    fallback_output: str | None = None
+
+
+class StepFailed(Exception):
+    def __init__(self, step: str, error: Exception):
+        super().__init__(f"Step '{step}' failed: {error}")
+        self.step = step
+        self.error = error
+
+
+class SubmissionPipeline:
+    def __init__(self):
+        # tool modules (and smolagents) are imported here, on first use, not when pipeline is imported
+        self.generate_name = tools.GenerateSubmissionNameTool()
+        self.prepare_metadata = tools.PrepareAllMetadataTool()
+        self.validate_metadata = tools.ValidateMetadataTool()
+        self.get_my_studies = tools.GetMyStudiesTool()
+        self.create_submission = tools.CreateSubmissionTool()
+        self.create_batch = tools.CreateBatchTool()
+        self.upload_batch = tools.UploadBatchTool()
+        self.update_batch = tools.UpdateBatchTool()
+
+    def run(self, config: PipelineConfig, result: PipelineResult | None = None) -> PipelineResult:
+        """Run every step not yet in `result.completed_steps` (all of them for a new run)."""
+        result = result or PipelineResult()
+        with span("pipeline.run", "pipeline", folder=config.folder_path, resumed=result.resumed) as root:
+            self._run_steps(config, result)
+            if root is not None:
+                root.set(submission_name=result.submission_name, failed_step=result.failed_step)
+                if result.failed_step:
+                    root.fail(result.error)
+        return result
+
+    def _run_steps(self, config: PipelineConfig, result: PipelineResult) -> None:
+        try:
+            for step in STEPS:
+                if step not in result.completed_steps:
+                    self._run_step(step, config, result)
+        except StepFailed as e:
+            result.failed_step = e.step
+            result.error = str(e.error)
+            self._checkpoint(config, result, "failed")
+            if config.llm_fallback:
+                result.fallback_output = run_llm_fallback(config, result)
+        else:
+            self._checkpoint(config, result, "completed")
+
+    def resume(self, submission_name: str, **overrides) -> PipelineResult:
+        """Continue the recorded run for `submission_name`; `overrides` replace PipelineConfig fields."""
+        state = load_workflow_state(submission_name)
+        if state is None:
+            raise ValueError(f"No recorded run for submission '{submission_name}'")
+        config = PipelineConfig.model_validate_json(state[0]).model_copy(update=overrides)
+        result = PipelineResult.model_validate_json(state[1])
+        result.failed_step = result.error = result.fallback_output = None
+        result.resumed = True
+        if "upload" in result.completed_steps:
+            # files that failed to upload get another try, so the upload step and what follows run again
+            status = {f["file_name"]: f["upload_status"] for f in get_workflow_files(submission_name)}
+            if any(status.get(f.fileName) != "uploaded" for f in result.files):
+                result.completed_steps = result.completed_steps[:result.completed_steps.index("upload")]
+        return self.run(config, result)
+
+    def _checkpoint(self, config: PipelineConfig, result: PipelineResult, status: str) -> None:
+        if result.submission_name is None:
+            return
+        try:
+            save_workflow_state(result.submission_name, config.model_dump_json(), result.model_dump_json(), status)
+        except Exception as e:
+            print(f"Failed to checkpoint run '{result.submission_name}': {e}")
+
+    def _run_step(self, step: str, config: PipelineConfig, result: PipelineResult) -> None:
+        start = time.perf_counter()
+        try:
+            with span(f"step {step}", "step"):
+                getattr(self, f"_step_{step}")(config, result)
+        except Exception as e:
+            raise StepFailed(step, e) from e
+        finally:
+            result.timings[step] = time.perf_counter() - start
+        result.completed_steps.append(step)
+        self._checkpoint(config, result, "running")
+
+    def _step_generate_submission_name(self, config: PipelineConfig, result: PipelineResult) -> None:
+        result.submission_name = self.generate_name()
+
+    def _step_prepare_metadata(self, config: PipelineConfig, result: PipelineResult) -> None:
+        prepared = self.prepare_metadata(
+            folder_path=config.folder_path,
+            base_dir=config.base_dir,
+            submission_name=result.submission_name,
+            staging_mode=config.staging_mode,
+        )
+        if not prepared:
+            raise ValueError(f"No files found in {config.folder_path}")
+        result.files = [PreparedFile(fileName=f["fileName"], fullPath=f["fullPath"]) for f in prepared]
+
+    def _step_validate_metadata(self, config: PipelineConfig, result: PipelineResult) -> None:
+        if not config.validate_files:
+            return
+        report = self.validate_metadata(
+            files=[f.model_dump() for f in result.files],
+            submission_name=result.submission_name,
+            data_commons=config.data_commons,
+        )
+        result.rejected_files = report["invalid"]
+        result.files = [PreparedFile(**f) for f in report["valid"]]
+        if not result.files:
+            raise ValueError(f"All files failed validation: {report['invalid'][0]['errors']}")
+
+    def _step_get_my_studies(self, config: PipelineConfig, result: PipelineResult) -> None:
+        if config.study_id:
+            result.study_id = config.study_id
+            return
+        study_ids = self.get_my_studies()
+        if not study_ids:
+            raise ValueError("The submitter has no studies")
+        result.study_id = study_ids[0]
+
+    def _step_create_submission(self, config: PipelineConfig, result: PipelineResult) -> None:
+        submission = self.create_submission(
+            study_id=result.study_id,
+            data_commons=config.data_commons,
+            name=result.submission_name,
+            intention=config.intention,
+            data_type=config.data_type,
+        )
+        result.submission_id = submission["_id"]
+
+    def _step_create_batch(self, config: PipelineConfig, result: PipelineResult) -> None:
+        batch = self.create_batch(
+            batch_type=config.batch_type,
+            submission_id=result.submission_id,
+            submission_name=result.submission_name,
+            file_names=[f.fileName for f in result.files],
+        )
+        result.batch = batch
+        result.batch_id = batch["_id"]
+        result.batch_ids = [batch["_id"]]
+        self._record_batch(result, batch)
+
+    def _record_batch(self, result: PipelineResult, batch: dict) -> None:
+        from api.upload import signed_url_expiry  # pulls in requests; the tools have loaded it by now anyway
+
+        paths = {f.fileName: f.fullPath for f in result.files}
+        save_workflow_files(result.submission_name, [
+            {
+                "file_name": f["fileName"],
+                "full_path": paths.get(f["fileName"], f["fileName"]),
+                "batch_id": batch["_id"],
+                "signed_url": f["signedURL"],
+                "url_expires_at": signed_url_expiry(f["signedURL"]),
+            }
+            for f in batch.get("files") or []
+        ])
+
+    def _refresh_expired_urls(self, config: PipelineConfig, result: PipelineResult,
+                              pending: list[PreparedFile], state: dict[str, dict]) -> None:
+        """
+        Re-request signed URLs for pending files whose URL is missing or about to expire,
+        or whose batch was already closed with updateBatch.
+        """
+        cutoff = time.time() + URL_EXPIRY_MARGIN
+        expired = [
+            f for f in pending
+            if f.fileName not in state or not state[f.fileName]["signed_url"]
+            or (state[f.fileName]["url_expires_at"] or float("inf")) < cutoff
+            or state[f.fileName]["batch_id"] in result.updated_batches
+        ]
+        if not expired:
+            return
+        batch = self.create_batch(
+            batch_type=config.batch_type,
+            submission_id=result.submission_id,
+            submission_name=result.submission_name,
+            file_names=[f.fileName for f in expired],
+        )
+        for f in expired:
+            old_batch_id = state.get(f.fileName, {}).get("batch_id")
+            if old_batch_id:
+                result.superseded_files.setdefault(old_batch_id, {})[f.fileName] = batch["_id"]
+        self._record_batch(result, batch)
+        result.batch_ids.append(batch["_id"])
+        result.refreshed_urls += len(expired)
+        state.update({f["file_name"]: f for f in get_workflow_files(result.submission_name)})
+
+    def _step_upload(self, config: PipelineConfig, result: PipelineResult) -> None:
+        state = {f["file_name"]: f for f in get_workflow_files(result.submission_name)}
+        pending = [f for f in result.files if state.get(f.fileName, {}).get("upload_status") != "uploaded"]
+        self._refresh_expired_urls(config, result, pending, state)
+
+        summary = {"total": 0, "succeeded": 0, "failed": 0, "skipped": 0, "bytes": 0, "seconds": 0.0,
+                   "bytes_per_sec": 0.0, "files": []}
+        if pending:
+            summary = self.upload_batch(
+                batch={"_id": result.batch_id,
+                       "files": [{"fileName": f.fileName, "signedURL": state[f.fileName]["signed_url"]}
+                                 for f in pending]},
+                submission_name=result.submission_name,
+                file_paths=[f.fullPath for f in pending],
+                max_workers=config.upload_workers,
+            )
+        # files uploaded by an earlier attempt of this run count as done
+        pending_names = {f.fileName for f in pending}
+        done = [
+            {"fileName": f.fileName, "fullPath": f.fullPath, "succeeded": True, "errors": None,
+             "bytes": 0, "seconds": 0.0, "attempts": 0, "skipped": True}
+            for f in result.files if f.fileName not in pending_names
+        ]
+        summary["files"] = done + summary["files"]
+        summary["total"] += len(done)
+        summary["succeeded"] += len(done)
+        summary["skipped"] += len(done)
+        result.upload = summary
+        if result.upload["succeeded"] == 0:
+            raise RuntimeError(f"No files uploaded: {result.upload['files'][0]['errors']}")
+
+    def _step_update_batch(self, config: PipelineConfig, result: PipelineResult) -> None:
+        # files whose URLs were refreshed belong to a later batch; report each batch's own files
+        batch_of = {f["file_name"]: f["batch_id"] for f in get_workflow_files(result.submission_name)}
+        by_batch: dict[str, list[str]] = {}
+        for f in result.files:
+            by_batch.setdefault(batch_of.get(f.fileName) or result.batch_id, []).append(f.fileName)
+        # batches left behind by a URL refresh are closed too, even if none of their files stayed
+        for batch_id in result.batch_ids:
+            by_batch.setdefault(batch_id, [])
+        for batch_id, file_names in by_batch.items():
+            if batch_id in result.updated_batches:
+                continue
+            moved = result.superseded_files.get(batch_id, {})
+            moved_results = [
+                {"fileName": name, "succeeded": False, "errors": [f"Signed URL expired; re-requested in batch {new_id}."]}
+                for name, new_id in moved.items() if name not in file_names
+            ]
+            if not file_names and not moved_results:
+                continue
+            updated = self.update_batch(
+                batch_id=batch_id,
+                file_names=file_names + [r["fileName"] for r in moved_results],
+                upload_results=result.upload["files"] + moved_results,
+            )
+            if file_names:
+                result.batch_status = updated.get("status")
+            # checkpoint each batch, so a resumed run does not update it a second time
+            result.updated_batches.append(batch_id)
+            self._checkpoint(config, result, "running")
+
+
+def run_llm_fallback(config: PipelineConfig, result: PipelineResult) -> str:
+    """Hand the remaining steps to the Bedrock CodeAgent, seeded with what already succeeded."""
+    from smolagents.agents import CodeAgent
+    from smolagents.models import AmazonBedrockServerModel
+    from db.failure_context import failure_context
+    from llm.cache import cache_model
+
+    model = AmazonBedrockServerModel(
+        model_id="anthropic.claude-3-haiku-20240307-v1:0",
+        client_kwargs={"region_name": "us-east-1"},
+        inferenceConfig={"maxTokens": 2048}
+    )
+    cache_model(model)
+    trace_model(model)
+    pipeline = SubmissionPipeline()
+    agent = CodeAgent(
+        model=model,
+        tools=[pipeline.generate_name, pipeline.prepare_metadata, pipeline.validate_metadata, pipeline.get_my_studies,
+               pipeline.create_submission, pipeline.create_batch, pipeline.upload_batch,
+               pipeline.update_batch],
+        max_steps=len(STEPS),
+        additional_authorized_imports=['os', 'json', 'time', 'datetime', 'pathlib']
+    )
+    known = result.model_dump(include={"submission_name", "files", "study_id", "submission_id", "batch_id"},
+                              exclude_none=True)
+    remaining = STEPS[STEPS.index(result.failed_step):]
+    context = failure_context([STEP_FEEDBACK_TOOLS[step] for step in remaining])
+    prompt = (
+        "Important: Whenever you receive an object with an identifier, always access the ID using the key '_id', not 'id'. "
+        f"A scripted CRDC submission run failed at step '{result.failed_step}' with error: {result.error}. "
+        f"These values are already known, reuse them instead of repeating earlier steps: {json.dumps(known)}. "
+        f"Finish the remaining steps in order: {', '.join(remaining)}. "
+        f"Metadata folder: '{config.folder_path}', base directory: '{config.base_dir}', data commons "
+        f"'{config.data_commons}', intention '{config.intention}', data type '{config.data_type}', "
+        f"batch type '{config.batch_type}'. "
+        "Return all relevant submission and batch IDs and status updates at the end."
+    )
+    if context:
+        prompt += "\n" + context
+    return str(agent.run(prompt))
+
+
+def main(argv=None) -> PipelineResult:
+    parser = argparse.ArgumentParser(description="Run the CRDC metadata submission workflow without LLM planning.")
+    parser.add_argument("--folder", help="folder with the metadata files to submit")
+    parser.add_argument("--base-dir", help="directory that holds (or will hold) 'submissions'")
+    parser.add_argument("--resume", metavar="SUBMISSION_NAME", help="continue a recorded run instead of starting one")
+    parser.add_argument("--data-commons", default="CDS")
+    parser.add_argument("--intention", default="New/Update")
+    parser.add_argument("--data-type", default="Metadata Only")
+    parser.add_argument("--batch-type", default="metadata")
+    parser.add_argument("--study-id", help="study to submit to (default: most recent study)")
+    parser.add_argument("--upload-workers", type=int, default=4)
+    parser.add_argument("--no-validate", action="store_true", help="skip local TSV validation")
+    parser.add_argument("--no-llm-fallback", action="store_true", help="fail instead of handing over to the agent")
+    args = parser.parse_args(argv)
+    if not args.resume and not (args.folder and args.base_dir):
+        parser.error("--folder and --base-dir are required unless --resume is given")
+
+    init_schema()
+    if args.resume:
+        result = SubmissionPipeline().resume(args.resume, llm_fallback=not args.no_llm_fallback)
+        print(json.dumps(result.model_dump(exclude={"batch"}), indent=2, default=str))
+        if result.failed_step and args.no_llm_fallback:
+            raise SystemExit(1)
+        return result
+
+    config = PipelineConfig(
+        folder_path=args.folder,
+        base_dir=args.base_dir,
+        data_commons=args.data_commons,
+        intention=args.intention,
+        data_type=args.data_type,
+        batch_type=args.batch_type,
+        study_id=args.study_id,
+        upload_workers=args.upload_workers,
+        validate_files=not args.no_validate,
+        llm_fallback=not args.no_llm_fallback,
+    )
+    result = SubmissionPipeline().run(config)
+    print(json.dumps(result.model_dump(exclude={"batch"}), indent=2, default=str))
+    if result.failed_step and not config.llm_fallback:
+        raise SystemExit(1)
+    return result
+
+
+if __name__ == "__main__":
+    main()
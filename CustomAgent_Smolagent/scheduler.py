@@ -0,0 +1,153 @@
+"""scheduler.py
+
+Concurrent multi-submission runner for QA load tests.
+
+Runs the scripted submission workflow from `pipeline.py` for many metadata
+folders (or many copies of one template folder) on a worker pool, with an
+optional cap on GraphQL requests per second, and prints aggregate throughput
+and per-stage latency percentiles.
+
+    python scheduler.py --folder template/ --copies 50 --workers 8 --rate-limit 5 \
+        --base-dir /path/to/CustomAgent_Smolagent
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import json
+import math
+import time
+
+from api.client import configure_client, get_client
+from db.db import init_schema, open_connection_count
+from db.writer import flush_feedback
+from pipeline import PipelineConfig, PipelineResult, SubmissionPipeline, STEPS
+
+# pipeline step -> name reported in the summary
+STAGES = {
+    "generate_submission_name": "generateName",
+    "prepare_metadata": "prepareMetadata",
+    "validate_metadata": "validateMetadata",
+    "get_my_studies": "getMyStudies",
+    "create_submission": "createSubmission",
+    "create_batch": "createBatch",
+    "upload": "upload",
+    "update_batch": "updateBatch",
+}
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def run_load(configs: list[PipelineConfig], workers: int) -> dict:
+    """Run one pipeline per config on `workers` threads and return the aggregate report."""
+    results: list[PipelineResult] = []
+    errors: list[str] = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(SubmissionPipeline().run, c) for c in configs]
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(str(e))
+    wall = time.perf_counter() - start
+    return summarize(results, errors, wall)
+
+
+def summarize(results: list[PipelineResult], errors: list[str], wall: float) -> dict:
+    succeeded = [r for r in results if r.failed_step is None]
+    failed_steps: dict[str, int] = {}
+    for r in results:
+        if r.failed_step:
+            failed_steps[r.failed_step] = failed_steps.get(r.failed_step, 0) + 1
+
+    stages = {}
+    for step in STEPS:
+        # only count stages that ran to completion
+        samples = [r.timings[step] for r in results if step in r.completed_steps]
+        if not samples:
+            continue
+        stages[STAGES[step]] = {
+            "count": len(samples),
+            "p50_s": percentile(samples, 50),
+            "p90_s": percentile(samples, 90),
+            "p99_s": percentile(samples, 99),
+            "max_s": max(samples),
+        }
+
+    uploaded_bytes = sum(r.upload["bytes"] for r in results if r.upload)
+    total = len(results) + len(errors)
+    return {
+        "submissions": total,
+        "succeeded": len(succeeded),
+        "failed": total - len(succeeded),
+        "failed_steps": failed_steps,
+        "errors": errors[:20],
+        "wall_s": wall,
+        "submissions_per_min": len(succeeded) / wall * 60 if wall > 0 else 0.0,
+        "uploaded_bytes": uploaded_bytes,
+        "stages": stages,
+        "graphql": get_client().stats(),
+        # stays at a handful however many submissions ran; growth means pool threads leak connections
+        "open_db_connections": open_connection_count(),
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\n{report['succeeded']}/{report['submissions']} submissions succeeded in {report['wall_s']:.1f}s "
+          f"({report['submissions_per_min']:.1f}/min, {report['uploaded_bytes']} bytes uploaded, "
+          f"{report['open_db_connections']} db connections open)")
+    if report["failed_steps"]:
+        print("Failures by step: " + ", ".join(f"{k}={v}" for k, v in report["failed_steps"].items()))
+    print(f"{'stage':<18}{'n':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<18}{s['count']:>6}{s['p50_s'] * 1e3:>10.1f}{s['p90_s'] * 1e3:>10.1f}"
+              f"{s['p99_s'] * 1e3:>10.1f}{s['max_s'] * 1e3:>10.1f}")
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Run many CRDC submission workflows concurrently.")
+    parser.add_argument("--folder", action="append", required=True,
+                        help="metadata folder; repeat for several folders")
+    parser.add_argument("--copies", type=int, default=1, help="submissions per folder")
+    parser.add_argument("--base-dir", required=True, help="directory that holds (or will hold) 'submissions'")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent submission workflows")
+    parser.add_argument("--rate-limit", type=float, default=0, help="max GraphQL requests/second (0 = unlimited)")
+    parser.add_argument("--upload-workers", type=int, default=4, help="concurrent uploads per submission")
+    parser.add_argument("--data-commons", default="CDS")
+    parser.add_argument("--data-type", default="Metadata Only")
+    parser.add_argument("--study-id", help="study to submit to (default: most recent study)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    init_schema()
+    configure_client(rate_limit=args.rate_limit, pool_size=max(16, args.workers * args.upload_workers))
+    configs = [
+        PipelineConfig(
+            folder_path=folder,
+            base_dir=args.base_dir,
+            data_commons=args.data_commons,
+            data_type=args.data_type,
+            study_id=args.study_id,
+            upload_workers=args.upload_workers,
+            llm_fallback=False,
+        )
+        for folder in args.folder
+        for _ in range(args.copies)
+    ]
+    report = run_load(configs, args.workers)
+    flush_feedback()
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""cache.py
+
+Content hashes for metadata files.
+
+Every file is identified by its SHA-256, stored in feedback.db (`file_hashes`)
+together with the size and mtime it was computed for. When a file's size and
+mtime are unchanged the recorded hash is reused without reading the file, so
+repeated runs over the same templates only re-read files that changed.
+"""
+import hashlib
+import os
+import threading
+
+from db.db import get_file_hash, put_file_hashes
+from tracing.spans import span
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with span("sha256_file", "disk") as s, open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            h.update(block)
+        if s is not None:
+            s.add_bytes(f.tell())
+    return h.hexdigest()
+
+
+class ContentCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "hash_hits": 0,       # hash reused from size/mtime fast path
+            "hash_misses": 0,     # file had to be read and hashed
+            "bytes_hashed": 0,
+        }
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def hash_file(self, path: str) -> str:
+        """SHA-256 of `path`, re-read only when its size or mtime changed since it was last hashed."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        known = get_file_hash(path)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            self._count(hash_hits=1)
+            return known[2]
+        sha = sha256_file(path)
+        put_file_hashes([(path, st.st_size, st.st_mtime_ns, sha)])
+        self._count(hash_misses=1, bytes_hashed=st.st_size)
+        return sha
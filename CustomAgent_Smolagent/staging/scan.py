@@ -0,0 +1,30 @@
+"""scan.py
+
+Directory scanning for metadata preparation, built on os.scandir so file
+type checks come from the directory entry instead of a stat per file.
+"""
+import fnmatch
+import os
+
+
+def scan_files(folder: str, recursive: bool = False, pattern: str | None = None) -> list[str]:
+    """
+    Return paths of regular files in `folder` (and its subfolders when `recursive`),
+    optionally filtered by a glob `pattern` on the file name, sorted by path.
+    Hidden files are skipped.
+    """
+    found = []
+    pending = [folder]
+    while pending:
+        current = pending.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_file():
+                    if pattern is None or fnmatch.fnmatch(entry.name, pattern):
+                        found.append(entry.path)
+                elif recursive and entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+    found.sort()
+    return found
@@ -1,23 +1,54 @@
-from .log_feedback import LogFeedbackTool
+"""Tool registry.
 
-__all__: list[str] = []
+Tool classes are imported on first use, so `import tools` (and importing a single
+tool module) does not pull in every tool and its dependencies:
 
-# ----- import & export each tool -----
-from .generate_submission_name import GenerateSubmissionNameTool
-__all__.append("GenerateSubmissionNameTool")
+    from tools import UploadBatchTool          # imports tools.upload_batch only
+    tools.create_tools("get_my_studies", "create_submission")
+"""
+import importlib
 
-from .prepare_metadata import PrepareAllMetadataTool
-__all__.append("PrepareAllMetadataTool")
+# tool name -> (module, class)
+TOOLS: dict[str, tuple[str, str]] = {
+    "generate_submission_name": ("generate_submission_name", "GenerateSubmissionNameTool"),
+    "prepare_all_sample_metadata": ("prepare_metadata", "PrepareAllMetadataTool"),
+    "validate_metadata": ("validate_metadata", "ValidateMetadataTool"),
+    "get_my_studies": ("get_my_studies", "GetMyStudiesTool"),
+    "create_submission": ("create_submission", "CreateSubmissionTool"),
+    "create_batch": ("create_batch", "CreateBatchTool"),
+    "upload_file": ("upload_file", "UploadFileTool"),
+    "upload_batch": ("upload_batch", "UploadBatchTool"),
+    "update_batch": ("update_batch", "UpdateBatchTool"),
+    "log_feedback": ("log_feedback", "LogFeedbackTool"),
+}
+_MODULE_BY_CLASS = {cls: module for module, cls in TOOLS.values()}
 
-from .get_my_studies import GetMyStudiesTool
-__all__.append("GetMyStudiesTool")
+__all__: list[str] = sorted(_MODULE_BY_CLASS) + ["TOOLS", "get_tool_class", "create_tools"]
 
-from .create_submission import CreateSubmissionTool
-__all__.append("CreateSubmissionTool")
 
-from .create_batch import CreateBatchTool
-__all__.append("CreateBatchTool")
+def get_tool_class(name: str):
+    """The Tool subclass registered under tool name `name` (e.g. 'upload_batch') or class name."""
+    if name in TOOLS:
+        module, cls = TOOLS[name]
+    elif name in _MODULE_BY_CLASS:
+        module, cls = _MODULE_BY_CLASS[name], name
+    else:
+        raise KeyError(f"Unknown tool {name!r}; known tools: {', '.join(TOOLS)}")
+    return getattr(importlib.import_module(f"{__name__}.{module}"), cls)
 
-#  NEW feedback logger
-from .log_feedback import LogFeedbackTool
-__all__.append("LogFeedbackTool")
\ No newline at end of file
+
+def create_tools(*names: str) -> list:
+    """Instances of the named tools (all registered tools if none are named)."""
+    return [get_tool_class(name)() for name in names or TOOLS]
+
+
+def __getattr__(name: str):
+    if name in _MODULE_BY_CLASS:
+        cls = get_tool_class(name)
+        globals()[name] = cls
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -1,17 +1,11 @@
 from smolagents.tools import Tool
-from db.db import log_feedback, get_file_id
+from tracing.spans import traced
+from tools.schema import InputSchema
+from api.client import get_client
+from api.resilience import NO_RETRY
+from db.writer import queue_feedback
 from typing import Type
 from pydantic import BaseModel, Field
-import os
-import requests
-
-API_URL = "https://hub-qa.datacommons.cancer.gov/api/graphql"
-SUBMIT_TOKEN = os.getenv("SUBMITTER_TOKEN")
-
-HEADERS = {
-    "Authorization": f"Bearer {SUBMIT_TOKEN}",
-    "Content-Type": "application/json"
-}
 
 
 class CreateBatchInput(BaseModel):
@@ -28,8 +22,9 @@ class CreateBatchTool(Tool):
     )
     input_model = CreateBatchInput
     output_type = "object"
-    inputs = input_model.model_json_schema()["properties"]
+    inputs = InputSchema(input_model)
     
+    @traced(kind="tool")
     def forward(self, batch_type: str, submission_id: str, submission_name: str, file_names: list[str]) -> dict:
         mutation = """
         mutation createBatch($submissionID: ID!, $type: String, $files: [String!]!) {
@@ -56,18 +51,16 @@ class CreateBatchTool(Tool):
             "files": file_names,
         }
         try:
-            res = requests.post(API_URL, json={"query": mutation, "variables": variables}, headers=HEADERS)
-            res.raise_for_status()
-            data = res.json()
-            if "errors" in data:
-                raise Exception(f"GraphQL errors: {data['errors']}")
+            # createBatch is not idempotent and a batch can't be looked up before retrying,
+            # so a lost response must not turn into a second batch
+            data = get_client().execute(mutation, variables, operation="createBatch", retry=NO_RETRY)
             
-            # Use submission_name (not submission_id) for DB lookups
+            # Use submission_name (not submission_id) for DB lookups; the writer resolves file ids
             for file_name in file_names:
                 try:
-                    file_id = get_file_id(submission_name, file_name)  # Changed here
-                    log_feedback(
-                        file_id=file_id,
+                    queue_feedback(
+                        submission_name=submission_name,
+                        file_name=file_name,
                         source="system",
                         is_accepted=True,
                         comments="Batch created and file included successfully.",
@@ -76,14 +69,14 @@ class CreateBatchTool(Tool):
                 except Exception as fe:
                     print(f"Failed to log system feedback for file '{file_name}': {fe}")
             
-            return data["data"]["createBatch"]
+            return data["createBatch"]
 
         except Exception as e:
             for file_name in file_names:
                 try:
-                    file_id = get_file_id(submission_name, file_name)  # Changed here
-                    log_feedback(
-                        file_id=file_id,
+                    queue_feedback(
+                        submission_name=submission_name,
+                        file_name=file_name,
                         source="system",
                         is_accepted=False,
                         comments=f"Batch creation failed: {e}",
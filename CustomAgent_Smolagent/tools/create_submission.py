@@ -1,18 +1,46 @@
 from smolagents.tools import Tool
-from db.db import log_feedback
+from tracing.spans import traced
+from tools.schema import InputSchema
+from api.client import get_client
+from api.resilience import NO_RETRY
+from db.db import log_feedback, get_api_response, put_api_response
 from typing import Type
 from pydantic import BaseModel, Field
 import time
-import os
-import requests
 
-API_URL = "https://hub-qa.datacommons.cancer.gov/api/graphql"
-SUBMIT_TOKEN = os.getenv("SUBMITTER_TOKEN")
-
-HEADERS = {
-    "Authorization": f"Bearer {SUBMIT_TOKEN}",
-    "Content-Type": "application/json"
+LIST_SUBMISSIONS = """
+query listSubmissions($first: Int, $offset: Int, $orderBy: String, $sortDirection: String) {
+    listSubmissions(first: $first, offset: $offset, orderBy: $orderBy, sortDirection: $sortDirection) {
+        submissions {
+            _id
+            name
+            studyID
+            status
+            createdAt
         }
+    }
+}
+"""
+
+
+def find_submission(name: str, study_id: str) -> dict | None:
+    """The most recent submission with this name in the study, or None (also if the lookup fails)."""
+    try:
+        data = get_client().execute(
+            LIST_SUBMISSIONS,
+            {"first": 50, "offset": 0, "orderBy": "createdAt", "sortDirection": "DESC"},
+            operation="listSubmissions",
+            retry=NO_RETRY,
+        )
+        submissions = (data.get("listSubmissions") or {}).get("submissions") or []
+    except Exception as e:
+        print(f"Could not check for an existing submission '{name}': {e}")
+        return None
+    for submission in submissions:
+        if submission.get("name") == name and submission.get("studyID") in (None, study_id):
+            return {k: submission.get(k) for k in ("_id", "status", "createdAt")}
+    return None
+
 
 class CreateSubmissionInput(BaseModel):
     study_id: str = Field(..., description="The ID of the study to submit data to.")
@@ -29,8 +57,9 @@ class CreateSubmissionTool(Tool):
     )
     input_model = CreateSubmissionInput
     output_type = "string"
-    inputs = input_model.model_json_schema()["properties"]
+    inputs = InputSchema(input_model)
     
+    @traced(kind="tool")
     def forward(self, study_id: str, data_commons: str, name: str, intention: str, data_type: str) -> dict:
         dummy_file_id = -1
 
@@ -58,15 +87,30 @@ class CreateSubmissionTool(Tool):
             "dataType": data_type,
         }
 
-        try:
-            res = requests.post(API_URL, json={"query": mutation, "variables": variables}, headers=HEADERS)
-            res.raise_for_status()
-            data = res.json()
+        # a submission name is only ever created once; a retried or repeated call returns the first result
+        idempotency_key = f"createSubmission|{get_client().api_url}|{study_id}|{data_commons}|{name}"
+        stored = get_api_response(idempotency_key)
+        if stored is not None:
+            log_feedback(
+                file_id=dummy_file_id,
+                source="system",
+                tool="CreateSubmission",
+                is_accepted=True,
+                comments=f"Reused existing submission: {stored['_id']}"
+            )
+            return stored
+
+        def before_retry(error):
+            # the failed attempt may still have created the submission on the server
+            existing = find_submission(name, study_id)
+            return {"createSubmission": existing} if existing else None
 
-            if "errors" in data:
-                raise Exception(f"GraphQL errors: {data['errors']}")
+        try:
+            data = get_client().execute(mutation, variables, operation="createSubmission",
+                                        before_retry=before_retry)
 
-            result = data["data"]["createSubmission"]
+            result = data["createSubmission"]
+            put_api_response(idempotency_key, "createSubmission", result)
 
             log_feedback(
                 file_id=dummy_file_id,
@@ -1,8 +1,11 @@
 from smolagents.tools import Tool
+from tracing.spans import traced
+from tools.schema import InputSchema
 from pydantic import BaseModel
-from db.db import log_feedback, insert_submission, get_feedback_for_tool
+from db.db import log_feedback, insert_submission
 from typing import Type
 from datetime import datetime
+import sqlite3
 
 class EmptyInput(BaseModel):
     pass
@@ -16,17 +19,22 @@ class GenerateSubmissionNameTool(Tool):
     )
     input_model = EmptyInput
     output_type = "string"
-    inputs = input_model.model_json_schema()["properties"]
+    inputs = InputSchema(input_model)
     
+    @traced(kind="tool")
     def forward(self):
-        feedback = get_feedback_for_tool(tool="GenerateSubmissionName")
-        #can use below for future learning
-        #for _, is_accepted, comment in feedback:
-        #    if not is_accepted and "submission name" in comment.lower():
-        #        print(f"⚠️ Noted past rejected pattern: {comment}")
-        
-        submission_name = "sub_" + datetime.now().strftime("%y%m%d_%H%M%S")
-        insert_submission(submission_name)
+        base_name = "sub_" + datetime.now().strftime("%y%m%d_%H%M%S")
+        submission_name = base_name
+        # Concurrent runs can start in the same second; the unique index on
+        # submission_name makes the insert the arbiter, so add a suffix until it succeeds
+        for n in range(2, 1000):
+            try:
+                insert_submission(submission_name)
+                break
+            except sqlite3.IntegrityError:
+                submission_name = f"{base_name}_{n}"
+        else:
+            raise RuntimeError(f"Could not generate a unique submission name from {base_name}")
         dummy_file_id = -1
         log_feedback(
             file_id=dummy_file_id,
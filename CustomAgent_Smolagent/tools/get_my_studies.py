@@ -1,56 +1,41 @@
 from smolagents.tools import Tool
+from tracing.spans import traced
+from tools.schema import InputSchema
 from typing import Type
+from api.studies import get_study_cache
 from db.db import log_feedback
 from pydantic import BaseModel, Field
-import requests
-import os
 
-API_URL = "https://hub-qa.datacommons.cancer.gov/api/graphql"
-SUBMIT_TOKEN = os.getenv("SUBMITTER_TOKEN")
 
-HEADERS = {
-    "Authorization": f"Bearer {SUBMIT_TOKEN}",
-    "Content-Type": "application/json"
-}
-        
-        
-class EmptyInput(BaseModel):
-    pass
+class GetMyStudiesInput(BaseModel):
+    refresh: bool = Field(False, description="Bypass the study cache and fetch the list again.",
+                          json_schema_extra={"nullable": True})
 
 
 class GetMyStudiesTool(Tool):
     name = "get_my_studies"
     description = (
-        "Fetches study IDs for the user using the CRDC GraphQL API."
+        "Fetches study IDs for the user using the CRDC GraphQL API, most recent study first. "
+        "Results are cached for the session; pass refresh=True to fetch them again."
     )
-    input_model = EmptyInput
+    input_model = GetMyStudiesInput
     output_type = "array"
-    inputs = input_model.model_json_schema()["properties"]
-    
-    def forward(self) -> list[str]:
-        query = """
-        query getMyUser {
-          getMyUser {
-            _id
-            studies {
-              _id
-            }
-          }
-        }
-        """
+    inputs = InputSchema(input_model)
+
+    @traced(kind="tool")
+    def forward(self, refresh: bool = False) -> list[str]:
         dummy_file_id = -1
         try:
-            res = requests.post(API_URL, json={"query": query}, headers=HEADERS)
-            res.raise_for_status()
-            data = res.json()
-            study_ids = [s["_id"] for s in data["data"]["getMyUser"]["studies"]]
-            log_feedback(
-                file_id=dummy_file_id,
-                source="system",
-                tool="GetMyStudies",
-                is_accepted=True,
-                comments=f"Fetched {len(study_ids)} study IDs."
-            )
+            study_ids, cached = get_study_cache().get(refresh=bool(refresh))
+            if not cached:
+                # only real fetches are logged; cache hits would flood the feedback table during load runs
+                log_feedback(
+                    file_id=dummy_file_id,
+                    source="system",
+                    tool="GetMyStudies",
+                    is_accepted=True,
+                    comments=f"Fetched {len(study_ids)} study IDs."
+                )
             return study_ids
         except Exception as e:
             log_feedback(
@@ -60,4 +45,4 @@ class GetMyStudiesTool(Tool):
                 is_accepted=False,
                 comments=f"Error fetching studies: {str(e)}"
             )
-            raise
\ No newline at end of file
+            raise
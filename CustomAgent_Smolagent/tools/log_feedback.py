@@ -1,4 +1,6 @@
 from smolagents.tools import Tool
+from tracing.spans import traced
+from tools.schema import InputSchema
 from pydantic import BaseModel, Field
 from typing import Literal
 from db.db import log_feedback
@@ -14,8 +16,9 @@ class LogFeedbackTool(Tool):
     description = "Persist feedback (yes/no + comment) into feedback.db"
     input_type  = LogFeedbackInput
     output_type = "string"
-    inputs      = LogFeedbackInput.model_json_schema()["properties"]
+    inputs      = InputSchema(LogFeedbackInput)
 
+    @traced(kind="tool")
     def forward(self, file_id, source, is_accepted, comments):
         log_feedback(
             file_id=file_id,
@@ -1,12 +1,16 @@
 from smolagents.tools import Tool
+from tracing.spans import current_span, traced
+from tools.schema import InputSchema
 from typing import List, Dict
 from typing import Type
 from pydantic import BaseModel, Field
-from db.db import log_feedback, get_file_id, insert_file, get_feedback_for_tool
+from db.db import register_files, get_learned_setting
+from db.writer import queue_feedback
+from staging.cache import ContentCache
+from staging.scan import scan_files
+from staging.stage import STAGING_MODES, stage_file, stage_files
 from datetime import datetime
-import time
 import os
-import shutil
 
 def is_expected_metadata_path(path: str, submission_name: str) -> bool:
     parts = os.path.normpath(path).split(os.sep)
@@ -28,30 +32,36 @@ class PrepareAllMetadataInput(BaseModel):
     folder_path: str = Field(..., description="Path to the folder containing sample metadata files to prepare.")
     base_dir: str = Field(..., description="Base directory where the 'submissions' folder resides or will be created.")
     submission_name: str = Field(..., description="Unique submission name generated externally (e.g., 'sub_250618_111826').")
+    staging_mode: str = Field("auto", description=f"How files are placed in the submission folder: one of {', '.join(STAGING_MODES)}. "
+                              "'auto' tries a reflink, then falls back to a copy; 'hardlink' and 'symlink' share data with the source files.", json_schema_extra={"nullable": True})
+    recursive: bool = Field(False, description="Also stage files from subfolders of folder_path.", json_schema_extra={"nullable": True})
+    pattern: str = Field("*", description="Glob filter on file names, e.g. '*.tsv'.", json_schema_extra={"nullable": True})
+    max_workers: int = Field(8, description="Number of files staged in parallel.", json_schema_extra={"nullable": True})
+    checksums: bool = Field(False, description="Report the SHA-256 of each file. Hashes are cached in feedback.db, so "
+                            "only files whose size or mtime changed since the last run are re-read.",
+                            json_schema_extra={"nullable": True})
     
 
 class PrepareAllMetadataTool(Tool):
     name = "prepare_all_sample_metadata"
     description = (
-        "Copies all files from the specified folder into a new submission metadata folder, "
+        "Stages (reflinks, hardlinks or copies) all files from the specified folder into a new submission metadata folder, "
         "renames each file with a timestamp for uniqueness, and returns metadata information "
         "for each copied file."
     )
     input_model = PrepareAllMetadataInput
     output_type = "array"
-    inputs = input_model.model_json_schema()["properties"]
+    inputs = InputSchema(input_model)
     
-    def forward(self, folder_path: str, base_dir: str, submission_name: str) -> List[Dict]:
+    @traced(kind="tool")
+    def forward(self, folder_path: str, base_dir: str, submission_name: str, staging_mode: str = "auto",
+                recursive: bool = False, pattern: str = "*", max_workers: int = 8, checksums: bool = False) -> List[Dict]:
         base_dir = os.path.normpath(base_dir)
         
-        feedback = get_feedback_for_tool(tool="PrepareMetadata")
-        for _, accepted, comment in reversed(feedback):
-            if accepted and "Saved to:" in comment:
-                path = comment.split("Saved to:")[1].strip()
-                if "CustomAgent_Smolagent/submissions" in path:
-                    learned = path.split("CustomAgent_Smolagent/submissions")[0].rstrip(os.sep)
-                    base_dir = learned
-                    break
+        # base dir of the last accepted "Saved to:" path, kept up to date by a trigger on feedback
+        learned = get_learned_setting("PrepareMetadata", "base_dir")
+        if learned is not None:
+            base_dir = learned
 
         # Determine the root directory for submissions
         if os.path.basename(base_dir) == "submissions":
@@ -70,52 +80,88 @@ class PrepareAllMetadataTool(Tool):
         metadata_folder = os.path.join(submission_folder, "metadata")
         os.makedirs(metadata_folder, exist_ok=True)
 
+        # One timestamp per run: every file of the submission gets the same suffix
+        run_time = datetime.now()
+        stamp = run_time.strftime('%Y%m%d_%H%M%S')
+        sources = scan_files(folder_path, recursive=recursive, pattern=pattern or None)
+
+        pairs, taken = [], set()
+        for file_path in sources:
+            stem, ext = os.path.splitext(os.path.basename(file_path))
+            new_file_name = f"{stem}_{stamp}{ext}"
+            # recursive scans can find the same base name in several subfolders
+            n = 2
+            while new_file_name in taken:
+                new_file_name = f"{stem}_{stamp}_{n}{ext}"
+                n += 1
+            taken.add(new_file_name)
+            pairs.append((file_path, os.path.join(metadata_folder, new_file_name)))
+
+        cache = None
+        if checksums:
+            cache = ContentCache()
+
+            # hash the source: its path is stable across runs, so unchanged templates hit the fast path
+            def stage_and_hash(src: str, dest: str, mode: str) -> tuple[str, int, str]:
+                return (*stage_file(src, dest, mode), cache.hash_file(src))
+
+            staged_info = stage_files(pairs, staging_mode, max_workers, stage=stage_and_hash)
+        else:
+            staged_info = stage_files(pairs, staging_mode, max_workers)
+
         results = []
-        for filename in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, filename)
-            if os.path.isfile(file_path):
-                base_name = os.path.basename(file_path)
-                new_file_name = f"{os.path.splitext(base_name)[0]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{os.path.splitext(base_name)[1]}"
-                dest_path = os.path.join(metadata_folder, new_file_name)
-                shutil.copy(file_path, dest_path)
-                results.append({
-                    "submission_folder": submission_folder,
-                    "metadata_folder": metadata_folder,
-                    "updated_file_path": dest_path,
-                    "fileName": new_file_name,
-                    "fullPath": dest_path,
-                    "submission_id": f"{submission_name}_{int(time.time())}",
-                    "created_at": datetime.now().isoformat(),
-                })
-                
-                try:
-                    file_id = insert_file(submission_name, new_file_name, dest_path)
-                except Exception as e:
-                    print(f"Warning: could not insert file record for {new_file_name}: {e}")
-                    file_id = -1
-
-                # Try to get real file_id and log feedback per file
-                try:
-                    file_id = get_file_id(submission_name, new_file_name)
-                    
-                    if is_expected_metadata_path(dest_path, submission_name):
-                        log_feedback(
-                            file_id=file_id,
-                            source="system",
-                            is_accepted=True,
-                            comments=f"File copied and metadata prepared. Saved to: {dest_path}",
-                            tool="PrepareMetadata"
-                        )
-                    else:
-                        log_feedback(
-                            file_id=file_id,
-                            source="system",
-                            is_accepted=False,
-                            comments=f"Invalid save path: {dest_path}",
-                            tool="PrepareMetadata"
-                        )
-                except Exception as fe:
-                    print(f"Warning: could not log feedback for file {new_file_name}: {fe}")
+        for (file_path, dest_path), (method, bytes_copied, *sha) in zip(pairs, staged_info):
+            results.append({
+                "submission_folder": submission_folder,
+                "metadata_folder": metadata_folder,
+                "updated_file_path": dest_path,
+                "fileName": os.path.basename(dest_path),
+                "fullPath": dest_path,
+                "submission_id": f"{submission_name}_{int(run_time.timestamp())}",
+                "created_at": run_time.isoformat(),
+                "staging_method": method,
+                "bytes_staged": os.path.getsize(dest_path),
+                "bytes_copied": bytes_copied,
+                "sha256": sha[0] if sha else None,
+            })
+
+        # staging stats go on the tool span rather than into the agent's observations
+        tool_span = current_span()
+        if tool_span is not None:
+            tool_span.set(files=len(results), bytes_staged=sum(r["bytes_staged"] for r in results),
+                          bytes_copied=sum(r["bytes_copied"] for r in results))
+            if cache is not None:
+                tool_span.set(**cache.stats())
+
+        # Register all copied files in one transaction instead of insert_file + get_file_id per file
+        try:
+            file_ids = register_files(submission_name, results)
+        except Exception as e:
+            print(f"Warning: could not insert file records for submission {submission_name}: {e}")
+            file_ids = {}
+
+        for r in results:
+            new_file_name, dest_path = r["fileName"], r["fullPath"]
+            try:
+                file_id = file_ids.get(new_file_name, -1)
 
+                if is_expected_metadata_path(dest_path, submission_name):
+                    queue_feedback(
+                        file_id=file_id,
+                        source="system",
+                        is_accepted=True,
+                        comments=f"File copied and metadata prepared. Saved to: {dest_path}",
+                        tool="PrepareMetadata"
+                    )
+                else:
+                    queue_feedback(
+                        file_id=file_id,
+                        source="system",
+                        is_accepted=False,
+                        comments=f"Invalid save path: {dest_path}",
+                        tool="PrepareMetadata"
+                    )
+            except Exception as fe:
+                print(f"Warning: could not log feedback for file {new_file_name}: {fe}")
 
         return results
\ No newline at end of file
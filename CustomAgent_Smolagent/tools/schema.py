@@ -0,0 +1,19 @@
+import functools
+
+
+@functools.cache
+def _properties(input_model) -> dict:
+    return input_model.model_json_schema()["properties"]
+
+
+class InputSchema:
+    """
+    `inputs = InputSchema(SomeInput)` on a Tool: the JSON schema properties of the pydantic
+    input model, generated when a tool is first instantiated instead of at import, once per model.
+    """
+
+    def __init__(self, input_model):
+        self.input_model = input_model
+
+    def __get__(self, obj, owner=None) -> dict:
+        return _properties(self.input_model)
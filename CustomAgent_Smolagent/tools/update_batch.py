@@ -1,22 +1,38 @@
 from smolagents.tools import Tool
+from tracing.spans import traced
+from tools.schema import InputSchema
 from typing import Type
 from pydantic import BaseModel, Field
-from db.db import log_feedback
-import requests
-import os
-
-API_URL = "https://hub-qa.datacommons.cancer.gov/api/graphql"
-SUBMIT_TOKEN = os.getenv("SUBMITTER_TOKEN")
-
-HEADERS = {
-    "Authorization": f"Bearer {SUBMIT_TOKEN}",
-    "Content-Type": "application/json"
-}
+from api.client import get_client
+from db.writer import queue_feedback
 
 class UpdateBatchInput(BaseModel):
     batch_id: str = Field(..., description="The ID of the batch to update.")
     file_names: list[str] = Field(..., description="List of uploaded file names to mark as succeeded.")
-    
+    upload_results: list[dict] = Field([], description="Optional per-file results ('files' from upload_batch). "
+                                       "When given, each file is reported with its real succeeded/errors status.", json_schema_extra={"nullable": True})
+
+
+def build_upload_results(file_names: list[str], upload_results: list[dict] | None = None) -> list[dict]:
+    """
+    Build the `UploadResult` list for updateBatch.
+    Without `upload_results` every file is reported as succeeded; with them, a file
+    missing from the results is reported as failed.
+    """
+    if not upload_results:
+        return [{"fileName": f, "succeeded": True, "errors": None} for f in file_names]
+
+    by_name = {r["fileName"]: r for r in upload_results}
+    payload = []
+    for name in file_names or list(by_name):
+        r = by_name.get(name)
+        if r is None:
+            payload.append({"fileName": name, "succeeded": False, "errors": ["File was not uploaded."]})
+        else:
+            succeeded = bool(r.get("succeeded"))
+            payload.append({"fileName": name, "succeeded": succeeded,
+                            "errors": None if succeeded else (r.get("errors") or ["Upload failed."])})
+    return payload
 
 class UpdateBatchTool(Tool):
     name = "update_batch"
@@ -25,9 +41,10 @@ class UpdateBatchTool(Tool):
     )
     input_model = UpdateBatchInput
     output_type = "string"
-    inputs = input_model.model_json_schema()["properties"]
+    inputs = InputSchema(input_model)
     
-    def forward(self, batch_id: str, file_names: list[str]) -> dict:
+    @traced(kind="tool")
+    def forward(self, batch_id: str, file_names: list[str], upload_results: list[dict] | None = None) -> dict:
         mutation = """
         mutation updateBatch($batchID: ID!, $files: [UploadResult]!) {
             updateBatch(batchID: $batchID, files: $files) {
@@ -50,7 +67,7 @@ class UpdateBatchTool(Tool):
             }
         }
         """
-        files_payload = [{"fileName": f, "succeeded": True, "errors": None} for f in file_names]
+        files_payload = build_upload_results(file_names, upload_results)
         variables = {
             "batchID": batch_id,
             "files": files_payload
@@ -59,32 +76,29 @@ class UpdateBatchTool(Tool):
         dummy_file_id = -1  # No file id available here
 
         try:
-            res = requests.post(API_URL, json={"query": mutation, "variables": variables}, headers=HEADERS)
-            res.raise_for_status()
-            data = res.json()
-            if "errors" in data:
-                raise Exception(f"GraphQL errors: {data['errors']}")
+            data = get_client().execute(mutation, variables, operation="updateBatch")
 
-            # Log success for each file
-            for file_name in file_names:
+            # Log the reported status for each file
+            for f in files_payload:
                 try:
-                    log_feedback(
+                    queue_feedback(
                         file_id=dummy_file_id,
                         source="system",
-                        is_accepted=True,
-                        comments="Batch file marked as succeeded.",
+                        is_accepted=f["succeeded"],
+                        comments="Batch file marked as succeeded." if f["succeeded"]
+                        else f"Batch file marked as failed: {f['errors']}",
                         tool=self.name
                     )
                 except Exception as fe:
-                    print(f"Failed to log success feedback for file '{file_name}': {fe}")
+                    print(f"Failed to log success feedback for file '{f['fileName']}': {fe}")
 
-            return data["data"]["updateBatch"]
+            return data["updateBatch"]
 
         except Exception as e:
             # Log failure for each file
-            for file_name in file_names:
+            for f in files_payload:
                 try:
-                    log_feedback(
+                    queue_feedback(
                         file_id=dummy_file_id,
                         source="system",
                         is_accepted=False,
@@ -92,5 +106,5 @@ class UpdateBatchTool(Tool):
                         tool=self.name
                     )
                 except Exception as fe:
-                    print(f"Failed to log failure feedback for file '{file_name}': {fe}")
+                    print(f"Failed to log failure feedback for file '{f['fileName']}': {fe}")
             raise
\ No newline at end of file
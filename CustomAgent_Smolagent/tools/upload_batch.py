@@ -0,0 +1,125 @@
+from smolagents.tools import Tool
+from tracing.spans import current_span, traced, wrap
+from tools.schema import InputSchema
+from pydantic import BaseModel, Field
+from concurrent.futures import ThreadPoolExecutor
+from api.upload import DEFAULT_CHUNK_SIZE, UploadError, stream_put
+from db.db import set_workflow_file_status
+from db.writer import queue_feedback
+import os
+import time
+
+
+class UploadBatchInput(BaseModel):
+    batch: dict = Field(..., description="The batch object returned from `create_batch`.")
+    submission_name: str = Field(..., description="The submission name to look up file IDs.")
+    file_paths: list[str] = Field(..., description="List of 'fullPath' values returned by prepare_all_sample_metadata.")
+    max_workers: int = Field(4, description="Number of files uploaded concurrently.", json_schema_extra={"nullable": True})
+    max_retries: int = Field(3, description="Upload attempts per file before it is reported as failed.", json_schema_extra={"nullable": True})
+    chunk_size: int = Field(DEFAULT_CHUNK_SIZE, description="Bytes sent per chunk while streaming each file.", json_schema_extra={"nullable": True})
+
+
+def _is_retryable(error: Exception) -> bool:
+    # 4xx other than throttling means the URL or payload is wrong; retrying will not help
+    if isinstance(error, UploadError) and error.status_code is not None:
+        return error.status_code == 429 or error.status_code >= 500
+    return True
+
+
+class UploadBatchTool(Tool):
+    name = "upload_batch"
+    description = (
+        "Uploads all files of a batch to their presigned URLs in parallel and returns one summary "
+        "with per-file results. Pass the returned 'files' list to update_batch as upload_results."
+    )
+    input_model = UploadBatchInput
+    output_type = "object"
+    inputs = InputSchema(input_model)
+
+    @traced(kind="tool")
+    def forward(self, batch: dict, submission_name: str, file_paths: list[str], max_workers: int = 4,
+                max_retries: int = 3, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+        signed_urls = {f["fileName"]: f["signedURL"] for f in batch.get("files") or []}
+
+        def upload_one(file_path: str) -> dict:
+            file_name = os.path.basename(file_path)
+            result = {
+                "fileName": file_name,
+                "fullPath": file_path,
+                "succeeded": False,
+                "errors": None,
+                "bytes": 0,
+                "seconds": 0.0,
+                "attempts": 0,
+                "skipped": False,
+            }
+            url = signed_urls.get(file_name)
+            if url is None:
+                result["errors"] = [f"File {file_name} not found in batch."]
+                return result
+
+            for attempt in range(1, max(1, max_retries) + 1):
+                result["attempts"] = attempt
+                try:
+                    stats = stream_put(url, file_path, chunk_size=chunk_size)
+                    result.update(succeeded=True, errors=None, bytes=stats["bytes"], seconds=stats["seconds"])
+                    return result
+                except Exception as e:
+                    result["errors"] = [str(e)]
+                    if attempt == max_retries or not _is_retryable(e):
+                        break
+                    time.sleep(min(0.5 * 2 ** (attempt - 1), 10))
+            return result
+
+        def upload_and_record(file_path: str) -> dict:
+            result = upload_one(file_path)
+            # checkpoint each file as it finishes, so a resumed pipeline run only retries the rest
+            try:
+                set_workflow_file_status(submission_name, result["fileName"],
+                                         "uploaded" if result["succeeded"] else "failed",
+                                         None if result["succeeded"] else result["errors"][0])
+            except Exception as e:
+                print(f"Failed to record upload status for '{result['fileName']}': {e}")
+            return result
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            results = list(pool.map(wrap(upload_and_record), file_paths))
+        elapsed = time.perf_counter() - start
+
+        for r in results:
+            try:
+                if r["succeeded"]:
+                    comments = f"Uploaded file {r['fullPath']} successfully ({r['bytes']} bytes, attempt {r['attempts']})."
+                else:
+                    comments = f"Failed to upload file {r['fullPath']}: {r['errors'][0]}"
+                queue_feedback(
+                    submission_name=submission_name,
+                    file_name=r["fileName"],
+                    source="system",
+                    is_accepted=r["succeeded"],
+                    comments=comments,
+                    tool=self.name
+                )
+            except Exception as fe:
+                print(f"Failed to log upload feedback for file '{r['fileName']}': {fe}")
+
+        total_bytes = sum(r["bytes"] for r in results)
+        succeeded = sum(1 for r in results if r["succeeded"])
+        rate = total_bytes / elapsed if elapsed > 0 else 0.0
+        # upload stats go on the tool span rather than into the agent's observations
+        tool_span = current_span()
+        if tool_span is not None:
+            tool_span.set(files=len(results), succeeded=succeeded, bytes_per_sec=rate)
+            tool_span.add_bytes(total_bytes)
+        return {
+            "batchID": batch.get("_id"),
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "skipped": sum(1 for r in results if r["skipped"]),
+            "bytes": total_bytes,
+            "seconds": elapsed,
+            "bytes_per_sec": rate,
+            "files": results,
+        }
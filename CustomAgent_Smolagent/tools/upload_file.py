@@ -1,9 +1,12 @@
 from smolagents.tools import Tool
+from tracing.spans import traced
+from tools.schema import InputSchema
 from typing import Type
 from pydantic import BaseModel, Field
-import mimetypes
+from api.upload import DEFAULT_CHUNK_SIZE, stream_put, format_rate
+from api.multipart import DEFAULT_PART_SIZE, multipart_put
 from db.db import log_feedback, get_file_id
-import requests
+import os
 
 
 class UploadFileInput(BaseModel):
@@ -11,17 +14,28 @@ class UploadFileInput(BaseModel):
     submission_name: str = Field(..., description="The submission name to look up file ID.")
     file_name: str = Field(..., description="The name of the file to find.")
     file_path: str = Field(..., description="Path to the local file to upload.")
+    chunk_size: int = Field(DEFAULT_CHUNK_SIZE, description="Bytes sent per chunk while streaming the file.", json_schema_extra={"nullable": True})
+    use_mmap: bool = Field(False, description="Stream from a memory map instead of a file handle.", json_schema_extra={"nullable": True})
+    resumable: bool = Field(False, description="Upload files larger than part_size as a resumable multipart upload. "
+                            "Only for endpoints listed in CRDC_MULTIPART_ENDPOINTS; Datahub presigned URLs do not support it.",
+                            json_schema_extra={"nullable": True})
+    part_size: int = Field(DEFAULT_PART_SIZE, description="Part size in bytes for resumable uploads.", json_schema_extra={"nullable": True})
 
 class UploadFileTool(Tool):
     name = "upload_file"
     description = (
-        "Extracts the signed URL for a specific file name from the batch object and uploads a local file to it via HTTP PUT."
+        "Extracts the signed URL for a specific file name from the batch object and streams a local file to it via HTTP PUT, "
+        "reporting the upload throughput. Resumable multipart uploads send unsigned requests and only work against "
+        "endpoints listed in CRDC_MULTIPART_ENDPOINTS (e.g. the local mock server), not against Datahub presigned URLs."
     )
     input_model = UploadFileInput
     output_type = "string"
-    inputs = input_model.model_json_schema()["properties"]
+    inputs = InputSchema(input_model)
     
-    def forward(self, batch: dict, submission_name: str, file_name: str, file_path: str) -> str:
+    @traced(kind="tool")
+    def forward(self, batch: dict, submission_name: str, file_name: str, file_path: str,
+                chunk_size: int = DEFAULT_CHUNK_SIZE, use_mmap: bool = False,
+                resumable: bool = False, part_size: int = DEFAULT_PART_SIZE) -> str:
         try:
             file_id = get_file_id(submission_name, file_name)
         except Exception as e:
@@ -45,31 +59,22 @@ class UploadFileTool(Tool):
             )
             raise ValueError(error_msg)
         
-        mime_type, _ = mimetypes.guess_type(file_path)
-        if not mime_type:
-            mime_type = "application/octet-stream"
-
-        headers = {
-            "Content-Type": mime_type
-        }
-
         try:
-            with open(file_path, "rb") as f:
-                file_data = f.read()
-
-            res = requests.put(presigned_url, data=file_data, headers=headers)
-            if not res.ok:
-                raise Exception(f"Error uploading file {file_path}: {res.text}")
+            if resumable and os.path.getsize(file_path) > part_size:
+                stats = multipart_put(presigned_url, file_path, part_size=part_size, chunk_size=chunk_size)
+            else:
+                stats = stream_put(presigned_url, file_path, chunk_size=chunk_size, use_mmap=use_mmap)
+            rate = format_rate(stats["bytes_per_sec"])
 
             log_feedback(
                 file_id=file_id,
                 source="system",
                 is_accepted=True,
-                comments=f"Uploaded file {file_path} successfully.",
+                comments=f"Uploaded file {file_path} successfully ({stats['bytes']} bytes, {rate}).",
                 tool=self.name
             )
 
-            return f"Uploaded {file_path}"
+            return f"Uploaded {file_path} ({stats['bytes']} bytes in {stats['seconds']:.2f}s, {rate})"
 
         except Exception as e:
             log_feedback(
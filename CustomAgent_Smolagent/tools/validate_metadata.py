@@ -0,0 +1,55 @@
+from smolagents.tools import Tool
+from tracing.spans import traced
+from tools.schema import InputSchema
+from pydantic import BaseModel, Field
+from db.writer import queue_feedback
+from validation.tsv import load_model, validate_tsv
+
+
+class ValidateMetadataInput(BaseModel):
+    files: list[dict] = Field(..., description="List returned by prepare_all_sample_metadata (uses 'fileName' and 'fullPath').")
+    submission_name: str = Field(..., description="The submission name, used to attach feedback to the files.")
+    data_commons: str = Field("CDS", description="Data commons whose data model the files are checked against.",
+                              json_schema_extra={"nullable": True})
+
+
+class ValidateMetadataTool(Tool):
+    name = "validate_metadata"
+    description = (
+        "Checks prepared metadata TSVs locally (encoding, header, column counts and, when a data model is "
+        "available, node types and required properties) before any API call. Returns the valid files and the "
+        "rejected files with their errors; only pass the valid files on to create_batch."
+    )
+    input_model = ValidateMetadataInput
+    output_type = "object"
+    inputs = InputSchema(input_model)
+
+    @traced(kind="tool")
+    def forward(self, files: list[dict], submission_name: str, data_commons: str = "CDS") -> dict:
+        model = load_model(data_commons)
+        valid, invalid = [], []
+        for f in files:
+            try:
+                report = validate_tsv(f["fullPath"], model)
+            except OSError as e:
+                report = {"valid": False, "rows": 0, "errors": [f"Could not read file: {e}"]}
+
+            if report["valid"]:
+                valid.append(f)
+            else:
+                invalid.append({"fileName": f["fileName"], "fullPath": f["fullPath"], "errors": report["errors"]})
+
+            try:
+                queue_feedback(
+                    submission_name=submission_name,
+                    file_name=f["fileName"],
+                    source="system",
+                    is_accepted=report["valid"],
+                    comments=f"Validated {report['rows']} rows." if report["valid"]
+                    else f"Validation failed: {'; '.join(report['errors'][:5])}",
+                    tool="ValidateMetadata"
+                )
+            except Exception as fe:
+                print(f"Warning: could not log feedback for file {f['fileName']}: {fe}")
+
+        return {"valid": valid, "invalid": invalid, "model_loaded": model is not None}
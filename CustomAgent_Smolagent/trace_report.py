@@ -0,0 +1,183 @@
+"""trace_report.py
+
+Report on the timing spans recorded in feedback.db (see `tracing/spans.py`).
+
+    python trace_report.py                      # slowest span names across all runs
+    python trace_report.py --since 24 --kind http --sort p95
+    python trace_report.py --runs 10            # slowest top-level runs
+    python trace_report.py --trace <trace_id>   # span tree of one run
+    python trace_report.py --since 1 --otlp spans.jsonl   # export as OTLP/JSON
+"""
+import argparse
+import json
+import math
+import time
+
+from db.db import connect, init_schema
+from tracing.spans import Span, to_otlp
+
+SORT_KEYS = ("total_ms", "p95_ms", "max_ms", "count")
+
+
+def _percentile(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+def _where(since_hours: float | None, kind: str | None) -> tuple[str, list]:
+    clauses, params = [], []
+    if since_hours:
+        clauses.append("start_ts >= ?")
+        params.append(time.time() - since_hours * 3600)
+    if kind:
+        clauses.append("kind = ?")
+        params.append(kind)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def stage_summary(since_hours: float | None = None, kind: str | None = None) -> list[dict]:
+    """Per (kind, name): count, errors, total/p50/p95/max duration, bytes and throughput."""
+    where, params = _where(since_hours, kind)
+    rows = connect().execute(
+        f"SELECT kind, name, duration_ms, status, bytes FROM spans{where} ORDER BY kind, name, duration_ms", params
+    )
+    groups: dict[tuple[str, str], dict] = {}
+    for kind_, name, duration, status, nbytes in rows:
+        g = groups.setdefault((kind_, name), {"durations": [], "errors": 0, "bytes": 0})
+        g["durations"].append(duration)
+        g["errors"] += status != "ok"
+        g["bytes"] += nbytes or 0
+    summary = []
+    for (kind_, name), g in groups.items():
+        durations = g["durations"]
+        total = sum(durations)
+        summary.append({
+            "kind": kind_,
+            "name": name,
+            "count": len(durations),
+            "errors": g["errors"],
+            "total_ms": total,
+            "p50_ms": _percentile(durations, 50),
+            "p95_ms": _percentile(durations, 95),
+            "max_ms": durations[-1],
+            "bytes": g["bytes"],
+            "mb_per_sec": g["bytes"] / 1024 ** 2 / (total / 1e3) if g["bytes"] and total > 0 else None,
+        })
+    return summary
+
+
+def slowest_runs(limit: int, since_hours: float | None = None) -> list[dict]:
+    """Top-level spans (pipeline or agent runs, or standalone calls) ordered by duration."""
+    where, params = _where(since_hours, None)
+    where = (where + " AND" if where else " WHERE") + " parent_id IS NULL"
+    rows = connect().execute(
+        f"""
+        SELECT trace_id, name, kind, start_ts, duration_ms, status, attributes,
+               (SELECT COUNT(*) FROM spans s2 WHERE s2.trace_id = spans.trace_id) AS span_count
+        FROM spans{where} ORDER BY duration_ms DESC LIMIT ?
+        """,
+        params + [limit],
+    )
+    return [
+        {"trace_id": r[0], "name": r[1], "kind": r[2], "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r[3])),
+         "duration_ms": r[4], "status": r[5], "attributes": json.loads(r[6]) if r[6] else {}, "spans": r[7]}
+        for r in rows
+    ]
+
+
+def _load_spans(where: str, params: list) -> list[Span]:
+    rows = connect().execute(
+        f"""
+        SELECT span_id, trace_id, parent_id, name, kind, start_ts, duration_ms, status, bytes, error, attributes
+        FROM spans{where} ORDER BY start_ts
+        """,
+        params,
+    )
+    spans = []
+    for span_id, trace_id, parent_id, name, kind, start_ts, duration, status, nbytes, error, attributes in rows:
+        s = Span.__new__(Span)
+        s.span_id, s.trace_id, s.parent_id, s.name, s.kind = span_id, trace_id, parent_id, name, kind
+        s.start_ns = int(start_ts * 1e9)
+        s.end_ns = s.start_ns + int(duration * 1e6)
+        s.status, s.bytes, s.error = status, nbytes, error
+        s.attributes = json.loads(attributes) if attributes else {}
+        spans.append(s)
+    return spans
+
+
+def print_trace(trace_id: str) -> None:
+    spans = _load_spans(" WHERE trace_id = ?", [trace_id])
+    if not spans:
+        print(f"No spans for trace {trace_id}")
+        return
+    children: dict[str | None, list[Span]] = {}
+    ids = {s.span_id for s in spans}
+    for s in spans:
+        # spans whose parent was not recorded are shown at the top level
+        children.setdefault(s.parent_id if s.parent_id in ids else None, []).append(s)
+
+    def show(parent: str | None, depth: int) -> None:
+        for s in children.get(parent, []):
+            extra = f"  {s.bytes} B" if s.bytes else ""
+            status = "" if s.status == "ok" else f"  ERROR {s.error}"
+            print(f"{'  ' * depth}{s.name:<{max(10, 50 - 2 * depth)}}{s.duration_ms:>10.1f} ms  [{s.kind}]{extra}{status}")
+            show(s.span_id, depth + 1)
+
+    show(None, 0)
+
+
+def print_summary(summary: list[dict], sort: str, limit: int) -> None:
+    summary = sorted(summary, key=lambda g: g[sort], reverse=True)[:limit]
+    print(f"{'kind':<10}{'name':<44}{'n':>7}{'err':>5}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'max ms':>10}{'MB/s':>9}")
+    for g in summary:
+        rate = f"{g['mb_per_sec']:.1f}" if g["mb_per_sec"] is not None else ""
+        print(f"{g['kind']:<10}{g['name'][:43]:<44}{g['count']:>7}{g['errors']:>5}{g['total_ms'] / 1e3:>10.2f}"
+              f"{g['p50_ms']:>10.1f}{g['p95_ms']:>10.1f}{g['max_ms']:>10.1f}{rate:>9}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Show the slowest stages recorded in the spans table.")
+    parser.add_argument("--since", type=float, help="only spans from the last N hours")
+    parser.add_argument("--kind", help="only this span kind (tool, http, db, disk, llm, step, pipeline, agent)")
+    parser.add_argument("--sort", choices=SORT_KEYS, default="total_ms")
+    parser.add_argument("--limit", type=int, default=25)
+    parser.add_argument("--runs", type=int, metavar="N", help="list the N slowest top-level runs instead")
+    parser.add_argument("--trace", help="print the span tree of one trace")
+    parser.add_argument("--otlp", metavar="FILE", help="export the selected spans as OTLP/JSON lines")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    init_schema()
+    if args.otlp:
+        where, params = _where(args.since, args.kind)
+        if args.trace:
+            where = (where + " AND" if where else " WHERE") + " trace_id = ?"
+            params.append(args.trace)
+        spans = _load_spans(where, params)
+        with open(args.otlp, "w", encoding="utf-8") as f:
+            for s in spans:
+                f.write(json.dumps(to_otlp(s)) + "\n")
+        print(f"Wrote {len(spans)} spans to {args.otlp}")
+    elif args.trace:
+        print_trace(args.trace)
+    elif args.runs:
+        runs = slowest_runs(args.runs, args.since)
+        if args.json:
+            print(json.dumps(runs, indent=2))
+        else:
+            for r in runs:
+                label = r["attributes"].get("submission_name") or ""
+                print(f"{r['trace_id']}  {r['started']}  {r['name']:<20}{r['duration_ms']:>10.1f} ms  "
+                      f"{r['spans']:>5} spans  {r['status']:<6}{label}")
+    else:
+        summary = stage_summary(args.since, args.kind)
+        if args.json:
+            print(json.dumps(sorted(summary, key=lambda g: g[args.sort], reverse=True)[:args.limit], indent=2))
+        else:
+            print_summary(summary, args.sort, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""spans.py
+
+Structured timing spans for agent and pipeline runs.
+
+A span records one unit of work (a tool call, a GraphQL attempt, an upload, a
+db helper, a disk copy, a model call) with its duration, byte count, status and
+attributes. Spans nest through a context variable, so every span started while
+another is open becomes its child and shares its trace id; thread pools keep
+the nesting when their tasks are wrapped with `wrap`.
+
+Tracing is off unless CRDC_TRACE=1; the decorators then only cost a flag check.
+Finished spans are queued to the background db writer (`spans` table), so
+recording one costs a queue put. Spans older than CRDC_TRACE_RETENTION_DAYS
+(default 7, 0 keeps everything) are deleted once per process, when the first
+span is recorded. With CRDC_TRACE_OTLP_FILE set spans are also appended to that
+file as OpenTelemetry OTLP/JSON lines, which an OTel collector (`filelog`
+receiver) or most trace viewers can import.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+ENABLED = os.getenv("CRDC_TRACE", "0") == "1"
+OTLP_FILE = os.getenv("CRDC_TRACE_OTLP_FILE")
+RETENTION_DAYS = float(os.getenv("CRDC_TRACE_RETENTION_DAYS", "7"))
+SERVICE_NAME = "crdc-submission-agent"
+
+INSERT_SPAN = """
+    INSERT INTO spans (span_id, trace_id, parent_id, name, kind, start_ts, duration_ms, status, bytes, error, attributes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+PRUNE_SPANS = "DELETE FROM spans WHERE start_ts < ?"
+
+# OTel SpanKind: INTERNAL = 1, CLIENT = 3
+_OTEL_KIND = {"http": 3, "llm": 3, "db": 3}
+
+_current: ContextVar["Span | None"] = ContextVar("crdc_span", default=None)
+_otlp_lock = threading.Lock()
+_otlp_file = None
+_pruned = False
+
+
+def set_enabled(enabled: bool) -> None:
+    global ENABLED
+    ENABLED = enabled
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns",
+                 "status", "bytes", "error", "attributes")
+
+    def __init__(self, name: str, kind: str, parent: "Span | None", attributes: dict):
+        self.trace_id = parent.trace_id if parent else _new_id(16)
+        self.span_id = _new_id(8)
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "ok"
+        self.bytes = None
+        self.error = None
+        self.attributes = attributes
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def add_bytes(self, n: int) -> None:
+        self.bytes = (self.bytes or 0) + n
+
+    def fail(self, error) -> None:
+        self.status = "error"
+        self.error = str(error)[:500]
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def current_trace_id() -> str | None:
+    span = _current.get()
+    return span.trace_id if span else None
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes):
+    """Time the enclosed block as a span; yields the Span (or None when tracing is off)."""
+    if not ENABLED:
+        yield None
+        return
+    s = Span(name, kind, _current.get(), attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.fail(e)
+        raise
+    finally:
+        _current.reset(token)
+        s.end_ns = time.time_ns()
+        _emit(s)
+
+
+def traced(name: str | None = None, kind: str = "internal"):
+    """Decorator form of `span`; the span is named after the function unless `name` is given."""
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with span(span_name, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def wrap(fn):
+    """Bind `fn` to the current span, so work submitted to a thread pool nests under it."""
+    parent = _current.get()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+def trace_model(model):
+    """Record each `generate` / `generate_stream` call of a smolagents model as an `llm` span."""
+    model_name = f"{type(model).__name__}.generate"
+    model_id = getattr(model, "model_id", None)
+
+    if hasattr(model, "generate"):
+        generate = model.generate
+
+        @functools.wraps(generate)
+        def traced_generate(*args, **kwargs):
+            with span(model_name, "llm", model_id=model_id) as s:
+                out = generate(*args, **kwargs)
+                usage = getattr(out, "token_usage", None)
+                if s is not None and usage is not None:
+                    s.set(input_tokens=usage.input_tokens, output_tokens=usage.output_tokens)
+                return out
+        model.generate = traced_generate
+
+    if hasattr(model, "generate_stream"):
+        generate_stream = model.generate_stream
+
+        @functools.wraps(generate_stream)
+        def traced_stream(*args, **kwargs):
+            # the span covers the whole stream, not just creating the generator
+            with span(model_name + "_stream", "llm", model_id=model_id):
+                yield from generate_stream(*args, **kwargs)
+        model.generate_stream = traced_stream
+    return model
+
+
+def _emit(s: Span) -> None:
+    global _pruned
+    try:
+        from db.writer import queue_row
+        if not _pruned:
+            _pruned = True
+            if RETENTION_DAYS > 0:
+                queue_row(PRUNE_SPANS, (time.time() - RETENTION_DAYS * 86400,))
+        queue_row(INSERT_SPAN, (s.span_id, s.trace_id, s.parent_id, s.name, s.kind, s.start_ns / 1e9,
+                                (s.end_ns - s.start_ns) / 1e6, s.status, s.bytes, s.error,
+                                json.dumps(s.attributes, default=str) if s.attributes else None))
+    except Exception as e:
+        print(f"Failed to record span {s.name}: {e}")
+    if OTLP_FILE:
+        _write_otlp(s)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(s: Span) -> dict:
+    """One span as an OTLP/JSON `ResourceSpans` document."""
+    attributes = dict(s.attributes, **{"crdc.kind": s.kind})
+    if s.bytes is not None:
+        attributes["crdc.bytes"] = s.bytes
+    otel = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": _OTEL_KIND.get(s.kind, 1),
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None],
+        # OTel status codes: 1 = OK, 2 = ERROR
+        "status": {"code": 2, "message": s.error} if s.status == "error" else {"code": 1},
+    }
+    if s.parent_id:
+        otel["parentSpanId"] = s.parent_id
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "crdc.tracing"}, "spans": [otel]}],
+    }]}
+
+
+def _write_otlp(s: Span) -> None:
+    global _otlp_file
+    line = json.dumps(to_otlp(s)) + "\n"
+    try:
+        with _otlp_lock:
+            if _otlp_file is None:
+                _otlp_file = open(OTLP_FILE, "a", encoding="utf-8")
+                atexit.register(_otlp_file.close)
+            _otlp_file.write(line)
+    except OSError as e:
+        print(f"Failed to write span to {OTLP_FILE}: {e}")
@@ -0,0 +1,214 @@
+"""tsv.py
+
+Local validation of metadata TSVs before anything is sent to the Datahub.
+
+Files are read as a byte stream in fixed-size blocks, so memory use does not
+depend on file size. Checks:
+
+    * the file is UTF-8 and has a header row
+    * header names are non-empty and unique, and include `type`
+    * every data row has as many columns as the header
+    * with a data model: the node in `type` exists, the header only uses the
+      node's properties (or `parent.key` link columns), and required
+      properties are present and non-empty in every row
+
+Data models use the MDF layout the CRDC data commons publish (a model file
+with `Nodes:` and a props file with `PropDefinitions:`). They are looked up in
+`CRDC_MODEL_DIR/<data commons>/` (default `models/<data commons>/` next to this
+package) and cached in memory until the files change.
+"""
+from functools import lru_cache
+from pathlib import Path
+import os
+import re
+
+import yaml
+
+MODEL_ROOT = Path(os.getenv("CRDC_MODEL_DIR", Path(__file__).resolve().parent.parent / "models"))
+READ_BUFFER = 4 * 1024 * 1024
+MAX_ERRORS_PER_FILE = 20
+
+
+class DataModel:
+    def __init__(self, nodes: dict[str, set[str]], required: set[str]):
+        self.nodes = nodes
+        self.required = required
+
+    def required_for(self, node: str) -> list[str]:
+        return sorted(p for p in self.nodes.get(node, ()) if p in self.required)
+
+
+def _is_required(definition: dict) -> bool:
+    req = (definition or {}).get("Req", False)
+    return req is True or str(req).lower() in ("true", "yes")
+
+
+@lru_cache(maxsize=8)
+def _load_model(model_files: tuple[tuple[str, float], ...]) -> DataModel:
+    nodes: dict[str, set[str]] = {}
+    required: set[str] = set()
+    for path, _ in model_files:
+        with open(path, "r", encoding="utf-8") as f:
+            doc = yaml.safe_load(f) or {}
+        for name, node in (doc.get("Nodes") or {}).items():
+            nodes.setdefault(name, set()).update((node or {}).get("Props") or [])
+        for prop, definition in (doc.get("PropDefinitions") or {}).items():
+            if _is_required(definition):
+                required.add(prop)
+    return DataModel(nodes, required)
+
+
+def load_model(data_commons: str, model_dir: str | None = None) -> DataModel | None:
+    """The cached data model for a data commons, or None if no model files are available."""
+    folder = Path(model_dir) if model_dir else MODEL_ROOT / data_commons
+    if not folder.is_dir():
+        return None
+    files = sorted(p for p in folder.iterdir() if p.suffix in (".yml", ".yaml"))
+    if not files:
+        return None
+    # mtimes are part of the cache key, so an updated model is reloaded automatically
+    return _load_model(tuple((str(p), p.stat().st_mtime) for p in files))
+
+
+def _row_pattern(width: int, type_idx: int | None, node: str | None, required: list[int]) -> re.Pattern:
+    """Regex matching a block of rows that are all valid, so clean blocks never go through Python per line."""
+    cols = []
+    for i in range(width):
+        if i == type_idx and node is not None:
+            cols.append(re.escape(node.encode("utf-8")))
+        elif i in required:
+            cols.append(rb"(?=[^\t\n]*[^\s])[^\t\n]*")
+        else:
+            cols.append(rb"[^\t\n]*")
+    return re.compile(rb"(?:" + rb"\t".join(cols) + rb"\r?\n)*")
+
+
+def validate_tsv(path: str, model: DataModel | None = None, max_errors: int = MAX_ERRORS_PER_FILE) -> dict:
+    """
+    Validate one TSV without loading it into memory.
+    Returns {"valid", "rows", "node", "error_count", "errors"}; `errors` is capped
+    at `max_errors` but `error_count` counts all of them.
+
+    The file is read in READ_BUFFER blocks cut at line boundaries. A block is first
+    checked as a whole (UTF-8 decode plus one compiled regex); only blocks that fail
+    are re-checked line by line to produce messages.
+    """
+    errors: list[str] = []
+    error_count = 0
+
+    def error(msg: str) -> None:
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < max_errors:
+            errors.append(msg)
+
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        if header_line.startswith(b"\xef\xbb\xbf"):
+            header_line = header_line[3:]
+        try:
+            header = header_line.rstrip(b"\r\n").decode("utf-8").split("\t")
+        except UnicodeDecodeError as e:
+            return {"valid": False, "rows": 0, "node": None, "error_count": 1,
+                    "errors": [f"Header is not valid UTF-8: {e}"]}
+        if header == [""]:
+            return {"valid": False, "rows": 0, "node": None, "error_count": 1, "errors": ["File is empty."]}
+
+        width = len(header)
+        seen = set()
+        for i, name in enumerate(header, 1):
+            if not name.strip():
+                error(f"Header column {i} is empty.")
+            elif name in seen:
+                error(f"Duplicate header column '{name}'.")
+            seen.add(name)
+        if "type" not in seen:
+            error("Header has no 'type' column.")
+        type_idx = header.index("type") if "type" in seen else None
+
+        state = {"rows": 0, "node": None, "required": [], "checked_node": False}
+
+        def check_line(lineno: int, line: bytes) -> None:
+            line = line.rstrip(b"\r")
+            if not line:
+                return
+            state["rows"] += 1
+            try:
+                line.decode("utf-8")
+            except UnicodeDecodeError as e:
+                error(f"Line {lineno}: not valid UTF-8 ({e.reason} at byte {e.start}).")
+                return
+            values = line.split(b"\t")
+            if len(values) != width:
+                error(f"Line {lineno}: {len(values)} columns, header has {width}.")
+                return
+            if type_idx is not None:
+                row_node = values[type_idx].decode("utf-8").strip()
+                if state["node"] is None:
+                    state["node"] = row_node
+                elif row_node != state["node"]:
+                    error(f"Line {lineno}: type '{row_node}' differs from '{state['node']}' in earlier rows.")
+            if model is not None and not state["checked_node"] and state["node"]:
+                state["checked_node"] = True
+                state["required"] = _check_header_against_model(header, state["node"], model, error)
+            for prop, idx in state["required"]:
+                if not values[idx].strip():
+                    error(f"Line {lineno}: required property '{prop}' is empty.")
+
+        pattern = None
+        lineno = 1
+        carry = b""
+        while True:
+            chunk = f.read(READ_BUFFER)
+            block = carry + chunk
+            if not chunk:
+                carry = b""
+                if block and not block.endswith(b"\n"):
+                    block += b"\n"
+            else:
+                cut = block.rfind(b"\n") + 1
+                block, carry = block[:cut], block[cut:]
+            if block:
+                lines = block.count(b"\n")
+                # the fast path needs the node from the first row, so that row always goes the slow way
+                if pattern is None and (state["node"] is not None or type_idx is None):
+                    pattern = _row_pattern(width, type_idx, state["node"], [i for _, i in state["required"]])
+                fast_ok = False
+                if pattern is not None and b"\n\n" not in block and not block.startswith(b"\n"):
+                    try:
+                        block.decode("utf-8")
+                        fast_ok = pattern.fullmatch(block) is not None
+                    except UnicodeDecodeError:
+                        pass
+                if fast_ok:
+                    state["rows"] += lines
+                else:
+                    for i, line in enumerate(block.split(b"\n")[:-1]):
+                        check_line(lineno + 1 + i, line)
+                lineno += lines
+            if not chunk:
+                break
+
+    if state["rows"] == 0:
+        error("File has a header but no data rows.")
+    return {"valid": error_count == 0, "rows": state["rows"], "node": state["node"],
+            "error_count": error_count, "errors": errors}
+
+
+def _check_header_against_model(header: list[str], node: str, model: DataModel, error) -> list[tuple[str, int]]:
+    """Check the header for `node`; returns (property, column index) of required properties present."""
+    props = model.nodes.get(node)
+    if props is None:
+        error(f"Unknown node type '{node}' for this data model.")
+        return []
+    for name in header:
+        # 'type' and parent link columns such as 'study.study_id' are not node properties
+        if name != "type" and "." not in name and name not in props:
+            error(f"Column '{name}' is not a property of node '{node}'.")
+    required_idx = []
+    for prop in model.required_for(node):
+        if prop in header:
+            required_idx.append((prop, header.index(prop)))
+        else:
+            error(f"Required property '{prop}' of node '{node}' is missing.")
+    return required_idx